@@ -1,5 +1,115 @@
 from django.contrib import admin
-from .models import Category, MonthlyBudget, Expense, Wallet, Transaction, Person, PersonalTransaction
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connections
+from django.urls import reverse
+from django.utils.functional import cached_property
+from .models import Category, MonthlyBudget, Expense, Wallet, Transaction, Person, PersonalTransaction, person_balance
+
+def estimated_row_count(model, using):
+    """Cheap row count of a model's table from the database's statistics, or None"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            # Ids only grow, so the highest one is an upper bound read from the primary key
+            cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+        else:
+            return None
+        row = cursor.fetchone()
+    # Postgres reports -1 for a table that was never analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never runs COUNT(*) over a whole big table.
+
+    An unfiltered changelist takes its size from the table statistics; a
+    filtered one counts at most `max_count` rows, so pages past that need a
+    narrower filter.
+    """
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.max_count:
+                return estimate
+        return queryset.order_by()[:self.max_count].count()
+
+class UserAutocompleteFilter(admin.ListFilter):
+    """Filter by user with the admin's autocomplete widget instead of a link per user"""
+    title = 'user'
+    parameter_name = 'user__id__exact'
+    template = 'admin/budget/user_autocomplete_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        self.request = request
+        self.model = model
+        self.model_admin = model_admin
+        value = params.pop(self.parameter_name, None)
+        if isinstance(value, list):
+            value = value[-1]
+        self.value = value or None
+        if self.value is not None:
+            self.used_parameters[self.parameter_name] = self.value
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.parameter_name]
+
+    def queryset(self, request, queryset):
+        if self.value is None:
+            return queryset
+        try:
+            return queryset.filter(user_id=int(self.value))
+        except ValueError:
+            raise IncorrectLookupParameters(f"Invalid user id {self.value!r}")
+
+    def choices(self, changelist):
+        yield {
+            'parameter_name': self.parameter_name,
+            'selected_id': self.value,
+            'selected_label': (
+                User.objects.filter(pk=self.value).values_list('username', flat=True).first() if self.value else None
+            ),
+            # Everything else in the query string survives picking a user; the page starts over
+            'hidden_params': [
+                (name, value)
+                for name, values in self.request.GET.lists()
+                if name not in (self.parameter_name, 'p', 'e')
+                for value in values
+            ],
+            'autocomplete_url': reverse(f'{self.model_admin.admin_site.name}:autocomplete'),
+            'app_label': self.model._meta.app_label,
+            'model_name': self.model._meta.model_name,
+            'field_name': 'user',
+        }
+
+class BudgetModelAdmin(admin.ModelAdmin):
+    """Changelist defaults for per-user tables that grow with every account's history"""
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) behind "N results (M total)"
+    show_full_result_count = False
+    autocomplete_fields = ['user']
+
+    @property
+    def media(self):
+        # UserAutocompleteFilter renders the select2 widget used by autocomplete_fields
+        return super().media + AutocompleteSelect(self.model._meta.get_field('user'), self.admin_site).media
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -8,53 +118,60 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ['name']
 
 @admin.register(MonthlyBudget)
-class MonthlyBudgetAdmin(admin.ModelAdmin):
+class MonthlyBudgetAdmin(BudgetModelAdmin):
     list_display = ['user', 'month', 'amount']
-    list_filter = ['month', 'user']
+    list_filter = ['month', UserAutocompleteFilter]
+    list_select_related = ['user']
     search_fields = ['user__username']
 
 @admin.register(Expense)
-class ExpenseAdmin(admin.ModelAdmin):
+class ExpenseAdmin(BudgetModelAdmin):
     list_display = ['user', 'description', 'amount', 'category', 'date']
-    list_filter = ['category', 'date', 'user']
+    list_filter = ['category', 'date', UserAutocompleteFilter]
+    list_select_related = ['user', 'category']
     search_fields = ['description', 'user__username']
     date_hierarchy = 'date'
 
 @admin.register(Wallet)
-class WalletAdmin(admin.ModelAdmin):
+class WalletAdmin(BudgetModelAdmin):
     list_display = ['user', 'balance']
-    list_filter = ['user']
+    list_filter = [UserAutocompleteFilter]
+    list_select_related = ['user']
     search_fields = ['user__username']
-    readonly_fields = ['balance']
+    readonly_fields = ['balance', 'reconciled_transaction_id', 'reconciled_balance', 'reconciled_at']
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(BudgetModelAdmin):
     list_display = ['user', 'type', 'amount', 'description', 'date']
-    list_filter = ['type', 'date', 'user']
+    list_filter = ['type', 'date', UserAutocompleteFilter]
+    list_select_related = ['user']
     search_fields = ['description', 'user__username']
     date_hierarchy = 'date'
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user')
 
 @admin.register(Person)
-class PersonAdmin(admin.ModelAdmin):
+class PersonAdmin(BudgetModelAdmin):
     list_display = ['name', 'user', 'relationship', 'phone', 'email', 'get_balance']
-    list_filter = ['relationship', 'user']
+    list_filter = ['relationship', UserAutocompleteFilter]
+    list_select_related = ['user']
     search_fields = ['name', 'user__username', 'phone', 'email']
-    
+    # Running totals kept by PersonalTransaction writes; fix drift with recompute_person_balances
+    readonly_fields = ['lent', 'received', 'borrowed', 'paid_back']
+
+    def get_queryset(self, request):
+        # Balance from the running totals, so it is computed and sorted in SQL
+        return super().get_queryset(request).annotate(balance=person_balance())
+
     def get_balance(self, obj):
-        return f"₹{obj.get_balance():.2f}"
+        return f"₹{obj.balance:.2f}"
     get_balance.short_description = 'Balance'
-    get_balance.admin_order_field = 'name'
+    get_balance.admin_order_field = 'balance'
 
 @admin.register(PersonalTransaction)
-class PersonalTransactionAdmin(admin.ModelAdmin):
+class PersonalTransactionAdmin(BudgetModelAdmin):
     list_display = ['user', 'person', 'type', 'amount', 'description', 'date', 'is_settled']
-    list_filter = ['type', 'date', 'is_settled', 'user', 'person__relationship']
+    list_filter = ['type', 'date', 'is_settled', UserAutocompleteFilter, 'person__relationship']
+    list_select_related = ['user', 'person']
     search_fields = ['description', 'user__username', 'person__name']
     date_hierarchy = 'date'
     list_editable = ['is_settled']
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user', 'person')
\ No newline at end of file
+    autocomplete_fields = ['user', 'person']
@@ -5,4 +5,5 @@ class BudgetConfig(AppConfig):
     name = 'budget'
     
     def ready(self):
-        import budget.signals
\ No newline at end of file
+        import budget.signals
+        import budget.db
\ No newline at end of file
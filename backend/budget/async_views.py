@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework.utils.encoders import JSONEncoder
+from . import caching, views
+from .db import read_replica
+
+# Async variants of the read-heavy dashboard views. Each runs its independent
+# queries at the same time, so latency is bound by the slowest query instead
+# of their sum. Enable them per URL name with BUDGET_ASYNC_ROUTES; they pay
+# off under an ASGI server (budget_tracker/asgi.py).
+#
+# Django's own async ORM methods (aaggregate, acount...) all hop onto one
+# thread-sensitive executor and therefore still run one after another, so
+# each query here gets a worker thread (and so its own connection) instead.
+
+
+def route(name, sync_view, async_view):
+    """The view to mount for URL `name`: async when listed in BUDGET_ASYNC_ROUTES"""
+    return async_view if name in getattr(settings, 'BUDGET_ASYNC_ROUTES', ()) else sync_view
+
+
+def _run_query(query):
+    try:
+        return query()
+    finally:
+        # Worker threads are outside the request cycle that normally closes connections
+        close_old_connections()
+
+
+async def gather_queries(queries):
+    """Run a {name: callable} map of ORM queries concurrently; returns {name: result}"""
+    results = await asyncio.gather(*(
+        sync_to_async(_run_query, thread_sensitive=False)(query) for query in queries.values()
+    ))
+    return dict(zip(queries, results))
+
+
+def _json(data, status=200):
+    # DRF's encoder, so Decimals and dates come out exactly as from the sync views
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def _user_or_error(request):
+    if request.method != 'GET':
+        return None, HttpResponseNotAllowed(['GET'])
+    user = getattr(request, 'budget_user', None)
+    if user is None:
+        return None, _json({'error': 'User not found'}, status=404)
+    return user, None
+
+
+async def dashboard_summary(request):
+    """Async dashboard_summary"""
+    user, error = _user_or_error(request)
+    if error:
+        return error
+    try:
+        period = views.dashboard_period(datetime.now().date(), request.GET.get('month'))
+    except ValueError:
+        return _json({'error': 'Invalid month, expected YYYY-MM'}, status=400)
+    
+    results = await gather_queries(views.dashboard_queries(user, period))
+    return _json(views.build_dashboard(period, results))
+
+
+@caching.cached_response('monthly_reports')
+@read_replica
+async def monthly_reports(request):
+    """Async monthly_reports"""
+    user, error = _user_or_error(request)
+    if error:
+        return error
+    months = views.report_months(12)
+    results = await gather_queries(views.monthly_reports_queries(user, months))
+    return _json(views.build_monthly_reports(months, results))
+
+
+@caching.cached_response('personal_dashboard')
+async def personal_dashboard(request):
+    """Async personal_dashboard"""
+    user, error = _user_or_error(request)
+    if error:
+        return error
+    results = await gather_queries(views.personal_dashboard_queries(user))
+    return _json(views.build_personal_dashboard(results))
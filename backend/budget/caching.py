@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import time
+from datetime import date
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.response import Response
+from . import db
+
+# Per-user data version: every write to a user's budget data bumps it, and
+# cached responses are keyed by it, so a stale entry can never be looked up
+# again and simply ages out of the cache.
+VERSION_KEY = 'budget:version:{user_id}'
+# Categories are shared by every user, so renaming one bumps a global version
+CATEGORY_VERSION_KEY = 'budget:version:categories'
+RESPONSE_KEY = 'budget:response:{endpoint}:{user_id}:{version}:{params}'
+# Present while a user's last write is younger than BUDGET_REPLICA_STICKY_SECONDS
+RECENT_WRITE_KEY = 'budget:recent-write:{user_id}'
+
+
+def get_cache():
+    """The cache backend named by BUDGET_CACHE_ALIAS (locmem, file, memcached, redis...)"""
+    return caches[getattr(settings, 'BUDGET_CACHE_ALIAS', 'default')]
+
+
+def _fresh_version():
+    # Never reuse a number an evicted counter once had
+    return time.time_ns()
+
+
+def _bump(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), None)
+
+
+def _written(user_id):
+    _bump(VERSION_KEY.format(user_id=user_id))
+    get_cache().set(
+        RECENT_WRITE_KEY.format(user_id=user_id), True, getattr(settings, 'BUDGET_REPLICA_STICKY_SECONDS', 30)
+    )
+
+
+def bump_version(user):
+    """Invalidate every cached response of `user` (a User or its id) once the write commits"""
+    user_id = getattr(user, 'pk', user)
+    transaction.on_commit(lambda: _written(user_id))
+
+
+def wrote_recently(user):
+    """Whether `user` wrote within BUDGET_REPLICA_STICKY_SECONDS (and may not see it on a replica yet)"""
+    return get_cache().get(RECENT_WRITE_KEY.format(user_id=getattr(user, 'pk', user))) is not None
+
+
+def bump_category_version():
+    transaction.on_commit(lambda: _bump(CATEGORY_VERSION_KEY))
+
+
+def data_version(user):
+    """Current version token of a user's data, combining the user and category counters"""
+    cache = get_cache()
+    user_key = VERSION_KEY.format(user_id=getattr(user, 'pk', user))
+    versions = cache.get_many([user_key, CATEGORY_VERSION_KEY])
+    for key in (user_key, CATEGORY_VERSION_KEY):
+        if key not in versions:
+            # add() so two requests racing to initialise agree on one value
+            cache.add(key, _fresh_version(), None)
+            versions[key] = cache.get(key)
+    return f"{versions[user_key]}.{versions[CATEGORY_VERSION_KEY]}"
+
+
+def change_token(user):
+    """Token that changes whenever a response for `user` may change.
+
+    The date is part of it because the views report "this month" and "last
+    7 days" relative to today.
+    """
+    return f"{data_version(user)}.{date.today():%Y%m%d}"
+
+
+def request_change_token(request, user):
+    """change_token() computed at most once per request"""
+    token = getattr(request, 'budget_change_token', None)
+    if token is None:
+        token = change_token(user)
+        request.budget_change_token = token
+    return token
+
+
+def cached_value(user, name, compute, timeout=None):
+    """compute() memoised per user until their data changes (or the day rolls over)"""
+    key = RESPONSE_KEY.format(endpoint=name, user_id=user.pk, version=change_token(user), params='')
+    cache = get_cache()
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        # A lagging replica may not have reached the version in the key
+        if db.read_alias() is None:
+            cache.set(key, value, timeout or getattr(settings, 'BUDGET_CACHE_TIMEOUT', 3600))
+    return value
+
+
+def read_from_replica(request):
+    """Whether @db.read_replica served this request from the replica (so it must not be cached)"""
+    return getattr(request, 'budget_read_from_replica', False)
+
+
+def _params_digest(query_params):
+    items = sorted((key, value) for key in query_params for value in query_params.getlist(key))
+    return hashlib.md5(repr(items).encode()).hexdigest()
+
+
+def cached_response(endpoint):
+    """Cache a GET view's successful response per (endpoint, user, params, data version).
+
+    Goes below @api_view and the other DRF decorators; the view reads the
+    acting user from request.budget_user. Plain async views are cached as
+    their rendered JSON body.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            return _async_cached(view, endpoint)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user = getattr(request, 'budget_user', None)
+            if request.method != 'GET' or user is None:
+                return view(request, *args, **kwargs)
+            key = RESPONSE_KEY.format(
+                endpoint=endpoint,
+                user_id=user.pk,
+                version=request_change_token(request, user),
+                params=_params_digest(request.query_params),
+            )
+            cache = get_cache()
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not read_from_replica(request):
+                cache.set(key, response.data, getattr(settings, 'BUDGET_CACHE_TIMEOUT', 3600))
+            return response
+        return wrapper
+    return decorator
+
+
+def _async_cached(view, endpoint):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = getattr(request, 'budget_user', None)
+        if request.method != 'GET' or user is None:
+            return await view(request, *args, **kwargs)
+        key = RESPONSE_KEY.format(
+            endpoint=f'{endpoint}:async',
+            user_id=user.pk,
+            version=await sync_to_async(request_change_token)(request, user),
+            params=_params_digest(request.GET),
+        )
+        cache = get_cache()
+        content = await cache.aget(key)
+        if content is not None:
+            return HttpResponse(content, content_type='application/json')
+        response = await view(request, *args, **kwargs)
+        if response.status_code == 200 and not read_from_replica(request):
+            await cache.aset(key, response.content, getattr(settings, 'BUDGET_CACHE_TIMEOUT', 3600))
+        return response
+    return wrapper
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from functools import wraps
+from types import MethodType
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from . import caching
+
+logger = logging.getLogger(__name__)
+
+# Alias the current view reads from; set by @read_replica. A context variable,
+# so the worker threads of the async views inherit it.
+_read_alias = ContextVar('budget_read_alias', default=None)
+
+
+def _begin_immediate(self):
+    self.cursor().execute('BEGIN IMMEDIATE')
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """Apply BUDGET_SQLITE_PRAGMAS and BUDGET_SQLITE_IMMEDIATE_TRANSACTIONS to a new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in getattr(settings, 'BUDGET_SQLITE_PRAGMAS', {}).items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+    if connection.alias == replica_alias():
+        # The replica is a copy made by sync_replica; writing to it would be lost
+        connection.connection.execute('PRAGMA query_only = ON')
+    if getattr(settings, 'BUDGET_SQLITE_IMMEDIATE_TRANSACTIONS', False):
+        # What Django 5.1's OPTIONS['transaction_mode'] = 'IMMEDIATE' does
+        connection._start_transaction_under_autocommit = MethodType(_begin_immediate, connection)
+    else:
+        connection.__dict__.pop('_start_transaction_under_autocommit', None)
+
+
+def read_alias():
+    """Database the current @read_replica view reads from, or None outside one"""
+    return _read_alias.get()
+
+
+def replica_alias():
+    """The configured replica's database alias, or None when there is none"""
+    alias = getattr(settings, 'BUDGET_REPLICA_ALIAS', None)
+    return alias if alias in settings.DATABASES else None
+
+
+class ReplicaRouter:
+    """Reads inside @read_replica views go to the replica; everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Even for an object that was read from the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica gets its schema from the primary
+        return db != replica_alias()
+
+
+def _read_from(request):
+    """Alias for a read-only request: the replica, unless the user wrote recently or there is none"""
+    alias = replica_alias()
+    user = getattr(request, 'budget_user', None)
+    if alias is None or user is None or caching.wrote_recently(user):
+        return None
+    return alias
+
+
+def _fall_back(view, request, error):
+    logger.warning('Replica read failed in %s, retrying on the primary: %s', view.__name__, error)
+    _mark(request, False)
+
+
+def _mark(request, from_replica):
+    # On the Django request, so the ETag middleware sees it too; DRF's Request proxies reads
+    getattr(request, '_request', request).budget_read_from_replica = from_replica
+
+
+def read_replica(view):
+    """Run a read-only view's queries on the replica (BUDGET_REPLICA_ALIAS).
+
+    A user who wrote within BUDGET_REPLICA_STICKY_SECONDS reads from the
+    primary, so they always see their own changes. If the replica fails (not
+    reachable, or not synced yet) the view runs again on the primary.
+    Responses read from the replica are marked so they are neither cached
+    nor given an ETag: either is keyed by the primary's data version, which
+    a lagging replica may not have reached. Goes below @caching.cached_response
+    and the DRF decorators; works on async views too.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            alias = await sync_to_async(_read_from)(request)
+            if alias is None:
+                return await view(request, *args, **kwargs)
+            token = _read_alias.set(alias)
+            _mark(request, True)
+            try:
+                return await view(request, *args, **kwargs)
+            except OperationalError as error:
+                _fall_back(view, request, error)
+            finally:
+                _read_alias.reset(token)
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = _read_from(request)
+        if alias is None:
+            return view(request, *args, **kwargs)
+        token = _read_alias.set(alias)
+        _mark(request, True)
+        try:
+            return view(request, *args, **kwargs)
+        except OperationalError as error:
+            _fall_back(view, request, error)
+        finally:
+            _read_alias.reset(token)
+        return view(request, *args, **kwargs)
+    return wrapper
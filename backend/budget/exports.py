@@ -0,0 +1,99 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+from .db import read_alias
+from .models import Expense, Transaction
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_COLUMNS = ['record', 'date', 'type', 'amount', 'description', 'category', 'payment_mode']
+
+
+class _ExportRenderer(BaseRenderer):
+    """Lets DRF accept ?format=csv|ndjson; export views stream their own response.
+
+    Anything else rendered in these formats (errors, mostly) is sent as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, default=str).encode(self.charset)
+
+
+class CSVRenderer(_ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(_ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+EXPORT_RENDERER_CLASSES = list(api_settings.DEFAULT_RENDERER_CLASSES) + [CSVRenderer, NDJSONRenderer]
+
+
+class _Echo:
+    """File-like object that hands back whatever csv.writer writes to it"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(user, start=None, end=None, using=None):
+    """Yield the user's transactions then expenses as flat rows, oldest first.
+
+    `start`/`end` are dates, both inclusive and optional. Rows are read with
+    values_list() through a server-side iterator so memory stays flat.
+    `using` pins the database, routed as usual when None.
+    """
+    transactions = Transaction.objects.using(using).filter(user=user)
+    expenses = Expense.objects.using(using).filter(user=user)
+    if start:
+        transactions = transactions.filter(date__gte=timezone.make_aware(datetime.combine(start, time.min)))
+        expenses = expenses.filter(date__gte=start)
+    if end:
+        end_at = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+        transactions = transactions.filter(date__lt=end_at)
+        expenses = expenses.filter(date__lte=end)
+
+    rows = transactions.order_by('date', 'id').values_list('date', 'type', 'amount', 'description')
+    for date, trans_type, amount, description in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield ['transaction', timezone.localtime(date).strftime('%Y-%m-%d'), trans_type, amount, description, '', '']
+
+    rows = expenses.order_by('date', 'id').values_list(
+        'date', 'amount', 'description', 'category__name', 'payment_mode'
+    )
+    for date, amount, description, category, payment_mode in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield ['expense', date.strftime('%Y-%m-%d'), 'EXPENSE', amount, description, category or 'Uncategorized', payment_mode]
+
+
+def _csv_stream(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_stream(rows):
+    for row in rows:
+        record = dict(zip(EXPORT_COLUMNS, row))
+        record['amount'] = float(record['amount'])
+        yield json.dumps(record) + '\n'
+
+
+def streaming_export(user, export_format, filename, start=None, end=None):
+    """StreamingHttpResponse for a csv/ndjson export of the user's history"""
+    # The rows are read while the response streams, after the view (and any
+    # @read_replica routing) has returned, so pin the database now
+    rows = export_rows(user, start, end, using=read_alias())
+    if export_format == 'csv':
+        response = StreamingHttpResponse(_csv_stream(rows), content_type='text/csv')
+    else:
+        response = StreamingHttpResponse(_ndjson_stream(rows), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
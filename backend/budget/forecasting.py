@@ -0,0 +1,192 @@
+from calendar import monthrange
+from datetime import date, timedelta
+import numpy as np
+from django.db.models import Sum
+from .models import Expense, MonthlyBudget
+from . import caching
+
+# Complete months the model learns from
+HISTORY_MONTHS = 6
+# An expense recurs when the same category and description is charged in at
+# least this many months, about once a month, for a steady amount
+MIN_RECURRING_MONTHS = 3
+MAX_RECURRING_CV = 0.2
+MAX_CHARGES_PER_MONTH = 1.5
+# How far this month's pace may scale the historical remainder
+MIN_PACE, MAX_PACE = 0.5, 2.0
+
+
+def _months_back(month_start, count):
+    for _ in range(count):
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
+    return month_start
+
+
+def forecast(user, today=None):
+    """Month-end projection per category for `user`, cached until their data changes"""
+    today = today or date.today()
+    if today != date.today():
+        return project(user, today)
+    return caching.cached_value(user, 'forecast', lambda: project(user, today))
+
+
+def project(user, today):
+    """Fit the per-category model on past months and project the month of `today`.
+
+    One query reads daily spend per (category, description) for the history
+    window and this month so far. From the complete months, per category:
+
+    - recurring expenses: descriptions charged in most months for a steady
+      amount, with their usual day of the month;
+    - a cumulative day-of-month curve of everything else, i.e. how much of a
+      month's variable spend is usually gone by each day, and the average
+      monthly variable total.
+
+    The rest of this month is the remaining part of the curve, scaled by how
+    this month's pace compares with history, plus the recurring expenses not
+    charged yet on their usual day. Categories without history are projected
+    linearly from this month so far.
+    """
+    month = today.replace(day=1)
+    days_in_month = monthrange(month.year, month.month)[1]
+    history_start = _months_back(month, HISTORY_MONTHS)
+    rows = list(
+        Expense.objects.filter(user=user, date__gte=history_start, date__lte=today)
+        .values_list('category__name', 'description', 'date')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    budget = MonthlyBudget.objects.filter(user=user, month=month).values_list('amount', flat=True).first()
+    budget = float(budget) if budget else 0.0
+
+    if rows:
+        category_names, raw_descriptions, dates, totals = (np.array(column) for column in zip(*rows))
+    else:
+        category_names = raw_descriptions = np.array([], dtype=str)
+        dates, totals = np.array([], dtype='datetime64[D]'), np.array([])
+    names, ci = np.unique(category_names, return_inverse=True)
+    # Recurring expenses are recognised by category and case-insensitive description
+    normalised = np.char.lower(np.char.strip(raw_descriptions.astype(str)))
+    _, description_index = np.unique(normalised, return_inverse=True)
+    keys, first_row, ki = np.unique(
+        ci * (description_index.max(initial=0) + 1) + description_index, return_index=True, return_inverse=True
+    )
+    key_category = ci[first_row]
+    descriptions = raw_descriptions[first_row]
+    dates = dates.astype('datetime64[D]')
+    months = dates.astype('datetime64[M]')
+    mi = (months - np.datetime64(history_start, 'M')).astype(np.intp)
+    di = (dates - months.astype('datetime64[D]')).astype(np.intp)
+    amounts = totals.astype(float)
+    C, K, H, t = len(names), len(keys), HISTORY_MONTHS, today.day - 1
+    past = mi < H
+    current = ~past
+
+    # Recurring expenses: per (category, description) and month, total, charge days and first day
+    key_month = np.zeros((K, H))
+    np.add.at(key_month, (ki[past], mi[past]), amounts[past])
+    charges = np.zeros((K, H))
+    np.add.at(charges, (ki[past], mi[past]), 1)
+    first_day = np.full((K, H), 31)
+    np.minimum.at(first_day, (ki[past], mi[past]), di[past])
+    present = key_month > 0
+    months_seen = present.sum(axis=1)
+    seen = np.maximum(months_seen, 1)
+    mean_amount = key_month.sum(axis=1) / seen
+    spread = np.sqrt((present * (key_month - mean_amount[:, None]) ** 2).sum(axis=1) / seen)
+    recurring = (
+        (months_seen >= MIN_RECURRING_MONTHS)
+        # Still active: charged last month or the one before
+        & present[:, -2:].any(axis=1)
+        & (spread <= MAX_RECURRING_CV * mean_amount)
+        & (charges.sum(axis=1) <= MAX_CHARGES_PER_MONTH * seen)
+    )
+    due_day = np.zeros(K, dtype=np.intp)
+    if recurring.any():
+        due_day[recurring] = np.nanmedian(
+            np.where(present[recurring], first_day[recurring], np.nan), axis=1
+        ).astype(np.intp)
+    charged = np.zeros(K, dtype=bool)
+    charged[ki[current]] = True
+
+    # Day-of-month curves of the variable (non-recurring) spend
+    variable = ~recurring[ki]
+    history = np.zeros((C, H, 31))
+    np.add.at(history, (ci[past & variable], mi[past & variable], di[past & variable]), amounts[past & variable])
+    # Average over the months since the user's first expense, not empty months before it
+    used = np.arange(H) >= (mi.min() if len(mi) else H)
+    month_totals = history[:, used].sum(axis=2)
+    monthly_variable = month_totals.mean(axis=1) if used.any() else np.zeros(C)
+    cumulative = history[:, used].cumsum(axis=2).sum(axis=1)
+    known = cumulative[:, -1] > 0
+    curve = np.tile(np.arange(1, 32) / 31, (C, 1))
+    curve[known] = cumulative[known] / cumulative[known, -1:]
+
+    spent = np.zeros(C)
+    np.add.at(spent, ci[current], amounts[current])
+    variable_spent = np.zeros(C)
+    np.add.at(variable_spent, ci[current & variable], amounts[current & variable])
+    daily_total = np.zeros(days_in_month)
+    np.add.at(daily_total, di[current], amounts[current])
+
+    # Expected spend per category and day for the rest of the month
+    upcoming = np.zeros((C, days_in_month))
+    expected_so_far = monthly_variable * curve[:, t]
+    pace = np.ones(C)
+    np.divide(variable_spent, expected_so_far, out=pace, where=expected_so_far > 0)
+    pace = np.clip(pace, MIN_PACE, MAX_PACE)
+    steps = np.diff(curve, axis=1, prepend=0)[:, :days_in_month]
+    # Spend usually made on days this month does not have lands on its last day
+    steps[:, -1] += 1 - curve[:, days_in_month - 1]
+    upcoming[:, t + 1:] = (monthly_variable * pace)[:, None] * steps[:, t + 1:]
+    # No history: carry on at this month's daily rate
+    new = (monthly_variable == 0) & (variable_spent > 0)
+    upcoming[new, t + 1:] = (variable_spent[new] / (t + 1))[:, None]
+    pending = recurring & ~charged
+    pending_days = np.clip(np.maximum(due_day[pending], t + 1), 0, days_in_month - 1)
+    if t + 1 < days_in_month:
+        np.add.at(upcoming, (key_category[pending], pending_days), mean_amount[pending])
+
+    projected = spent + upcoming.sum(axis=1)
+    path = np.cumsum(daily_total + upcoming.sum(axis=0))
+    overrun_date = None
+    if budget > 0:
+        over = np.nonzero(path > budget)[0]
+        if len(over):
+            overrun_date = (month + timedelta(days=int(over[0]))).isoformat()
+
+    recurring_by_category = {}
+    for k in np.nonzero(recurring)[0]:
+        recurring_by_category.setdefault(int(key_category[k]), []).append({
+            'description': str(descriptions[k]),
+            'amount': round(float(mean_amount[k]), 2),
+            'day': int(due_day[k]) + 1,
+            'charged': bool(charged[k]),
+        })
+    category_forecasts = sorted(
+        (
+            {
+                'category': str(names[c]),
+                'spent': round(float(spent[c]), 2),
+                'projected': round(float(projected[c]), 2),
+                'usual_monthly': round(float(monthly_variable[c] + sum(
+                    item['amount'] for item in recurring_by_category.get(c, [])
+                )), 2),
+                'recurring': recurring_by_category.get(c, []),
+            }
+            for c in range(C)
+            if projected[c] > 0
+        ),
+        key=lambda item: -item['projected'],
+    )
+    total_projected = float(projected.sum())
+    return {
+        'month': month.strftime('%Y-%m'),
+        'as_of': today.isoformat(),
+        'spent': round(float(spent.sum()), 2),
+        'projected': round(total_projected, 2),
+        'budget': budget,
+        'projected_remaining_budget': round(budget - total_projected, 2) if budget > 0 else None,
+        'overrun_date': overrun_date,
+        'categories': category_forecasts,
+    }
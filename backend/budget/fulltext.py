@@ -0,0 +1,113 @@
+import re
+from datetime import datetime
+from django.db import connection
+from django.db.models import Q
+from .models import Expense, Transaction, PersonalTransaction, PersonalRecord
+
+# FTS5 table created by migration 0012 on SQLite; keep the two in step
+SEARCH_TABLE = 'budget_search'
+# (source tag, model); a row's FTS rowid is its id * len(SOURCES) + position
+SOURCES = [
+    ('expense', Expense),
+    ('transaction', Transaction),
+    ('personal_transaction', PersonalTransaction),
+    ('personal_record', PersonalRecord),
+]
+MAX_TERMS = 10
+# The last word also matches as a prefix (search as you type) from this length;
+# shorter prefixes expand to too many terms to rank quickly
+MIN_PREFIX_LENGTH = 3
+
+_fts_available = {}
+
+
+def search_terms(query):
+    """Words of a search string, at most MAX_TERMS of them"""
+    return re.findall(r'\w+', query)[:MAX_TERMS]
+
+
+def fts_available():
+    """Whether this database has the FTS5 search table (checked once per database)"""
+    alias = connection.alias
+    if alias not in _fts_available:
+        available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_TABLE])
+                available = cursor.fetchone() is not None
+        _fts_available[alias] = available
+    return _fts_available[alias]
+
+
+def search(user, query, offset=0, limit=20):
+    """One page of `user`'s expenses, transactions and personal records matching every word of `query`.
+
+    The last word also matches as a prefix. With FTS5 results are ranked by
+    bm25; otherwise each table is searched with LIKE and results come newest
+    first. Returns (results, has_more), each result tagged with its source.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    if fts_available():
+        hits = _fts_hits(user, terms, offset, limit + 1)
+    else:
+        hits = _like_hits(user, terms, offset, limit + 1)
+    has_more = len(hits) > limit
+    return _load(user, hits[:limit]), has_more
+
+
+def _fts_hits(user, terms, offset, limit):
+    phrases = ['"{}"'.format(term.replace('"', '""')) for term in terms]
+    if len(terms[-1]) >= MIN_PREFIX_LENGTH:
+        phrases[-1] += '*'
+    with connection.cursor() as cursor:
+        # user_id is not indexed: the match finds the rows, then they are filtered by owner
+        cursor.execute(
+            f"SELECT rowid, bm25({SEARCH_TABLE}) AS score FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND user_id = %s ORDER BY score LIMIT %s OFFSET %s",
+            [' AND '.join(phrases), user.pk, limit, offset],
+        )
+        return [(rowid % len(SOURCES), rowid // len(SOURCES), score) for rowid, score in cursor.fetchall()]
+
+
+def _like_hits(user, terms, offset, limit):
+    # Substring matches, so every word behaves like a prefix here
+    condition = Q()
+    for term in terms:
+        condition &= Q(description__icontains=term)
+    hits = []
+    for code, (_, model) in enumerate(SOURCES):
+        rows = model.objects.filter(condition, user=user).order_by('-date', '-id').values_list('id', 'date')
+        for row_id, day in rows[:offset + limit]:
+            if isinstance(day, datetime):
+                day = day.date()
+            hits.append((day, row_id, code))
+    hits.sort(reverse=True)
+    return [(code, row_id, None) for _, row_id, code in hits[offset:offset + limit]]
+
+
+def _load(user, hits):
+    """Turn (source code, id, score) hits into result dicts, one query per source present"""
+    rows = {}
+    for code, (_, model) in enumerate(SOURCES):
+        ids = [row_id for hit_code, row_id, _ in hits if hit_code == code]
+        if ids:
+            # No ordering, so the rows are fetched by primary key
+            page = model.objects.filter(user=user, id__in=ids).order_by()
+            for row in page.values('id', 'description', 'amount', 'date'):
+                rows[code, row['id']] = row
+    results = []
+    for code, row_id, score in hits:
+        row = rows.get((code, row_id))
+        if row is None:
+            continue
+        results.append({
+            'source': SOURCES[code][0],
+            'id': row_id,
+            'description': row['description'],
+            'amount': float(row['amount']),
+            'date': row['date'].isoformat(),
+            'score': round(-score, 4) if score is not None else None,
+        })
+    return results
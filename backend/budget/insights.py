@@ -0,0 +1,111 @@
+from datetime import date, timedelta
+import numpy as np
+from django.db.models import Sum
+from .models import Expense
+from . import caching
+
+# Each day is compared with the BASELINE_DAYS before it; anomalies are
+# reported for the last RECENT_DAYS only, so only this much history is read.
+BASELINE_DAYS = 90
+RECENT_DAYS = 30
+Z_THRESHOLD = 3.0
+# A category needs this many spending days in its baseline to be judged at all
+MIN_ACTIVE_DAYS = 4
+# Lower bound on the standard deviation, in currency units and as a share of
+# the mean, so steady categories do not turn every small change into 10σ
+MIN_STD = 1.0
+MIN_STD_RATIO = 0.25
+MAX_ANOMALIES = 10
+
+
+def daily_spend(user, start, end):
+    """(category names, category x day spend matrix) for start..end, from one grouped query"""
+    rows = list(
+        Expense.objects.filter(user=user, date__gte=start, date__lte=end)
+        .values_list('category_id', 'category__name', 'date')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    days = (end - start).days + 1
+    if not rows:
+        return [], np.zeros((0, days))
+    category_ids, names, dates, totals = zip(*rows)
+    categories = {}
+    for category_id, name in zip(category_ids, names):
+        categories.setdefault(category_id, name)
+    index = {category_id: i for i, category_id in enumerate(categories)}
+    matrix = np.zeros((len(categories), days))
+    np.add.at(
+        matrix,
+        (
+            np.fromiter((index[category_id] for category_id in category_ids), dtype=np.intp, count=len(rows)),
+            np.fromiter(((day - start).days for day in dates), dtype=np.intp, count=len(rows)),
+        ),
+        np.array(totals, dtype=float),
+    )
+    return list(categories.values()), matrix
+
+
+def _trailing_sums(values, window):
+    """Sum of the `window` columns before each column from `window` on, for every row at once"""
+    cumulative = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1)
+    return cumulative[:, window:-1] - cumulative[:, :-window - 1]
+
+
+def analyse(names, matrix, start):
+    """Anomalies and week-over-week changes for a category x day matrix starting at `start`"""
+    if not names or matrix.shape[1] <= BASELINE_DAYS:
+        return {'anomalies': [], 'week_over_week': []}
+
+    recent = matrix[:, BASELINE_DAYS:]
+    mean = _trailing_sums(matrix, BASELINE_DAYS) / BASELINE_DAYS
+    variance = _trailing_sums(matrix ** 2, BASELINE_DAYS) / BASELINE_DAYS - mean ** 2
+    std = np.maximum(np.sqrt(np.maximum(variance, 0)), np.maximum(mean * MIN_STD_RATIO, MIN_STD))
+    active_days = _trailing_sums((matrix > 0).astype(float), BASELINE_DAYS)
+    zscores = (recent - mean) / std
+
+    flagged = (recent > 0) & (active_days >= MIN_ACTIVE_DAYS) & (zscores >= Z_THRESHOLD)
+    rows, columns = np.nonzero(flagged)
+    order = np.argsort(-zscores[rows, columns])[:MAX_ANOMALIES]
+    anomalies = []
+    for row, column in zip(rows[order], columns[order]):
+        day = start + timedelta(days=int(column) + BASELINE_DAYS)
+        zscore = float(zscores[row, column])
+        anomalies.append({
+            'category': names[row],
+            'date': day.isoformat(),
+            'amount': round(float(recent[row, column]), 2),
+            'usual': round(float(mean[row, column]), 2),
+            'zscore': round(zscore, 1),
+            'message': f"{names[row]} spend on {day.isoformat()} was {zscore:.1f}σ above normal",
+        })
+
+    this_week = matrix[:, -7:].sum(axis=1)
+    last_week = matrix[:, -14:-7].sum(axis=1)
+    change = this_week - last_week
+    week_over_week = []
+    for row in np.argsort(-np.abs(change)):
+        if not change[row]:
+            break
+        week_over_week.append({
+            'category': names[row],
+            'this_week': round(float(this_week[row]), 2),
+            'last_week': round(float(last_week[row]), 2),
+            'change': round(float(change[row]), 2),
+            'change_pct': round(float(change[row] / last_week[row] * 100), 1) if last_week[row] else None,
+        })
+    return {'anomalies': anomalies, 'week_over_week': week_over_week}
+
+
+def spending_anomalies(user, today=None):
+    """Ranked daily spending anomalies and weekly changes per category, cached until the user's data changes"""
+    today = today or date.today()
+    start = today - timedelta(days=BASELINE_DAYS + RECENT_DAYS - 1)
+
+    def compute():
+        names, matrix = daily_spend(user, start, today)
+        return analyse(names, matrix, start)
+
+    if today != date.today():
+        return compute()
+    return caching.cached_value(user, 'insights', compute)
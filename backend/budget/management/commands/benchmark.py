@@ -0,0 +1,399 @@
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Q, Sum
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, resolve
+from django.utils import timezone
+from budget import urls as budget_urls
+from budget.caching import get_cache
+from budget.models import (Category, MonthlyBudget, Expense, Wallet, Transaction, Person, PersonalTransaction,
+                           PersonalRecord)
+from budget.rollups import rebuild_rollups
+
+BENCH_USERNAME = 'muskan'
+BENCH_PASSWORD = 'benchmark'
+SEED_BATCH = 5000
+PRESETS = {
+    '1k': {'expenses': 1000, 'people': 100},
+    '100k': {'expenses': 100000, 'people': 5000},
+    '1m': {'expenses': 1000000, 'people': 5000},
+}
+# URL names that are not worth timing
+SKIPPED_URL_NAMES = {'api-root'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database and measure p50/p95 latency, query count and peak memory of every '
+        'API route; write the results as a JSON baseline or compare them against one'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--preset', choices=sorted(PRESETS), default='1k',
+                            help='Data volume: 1k, 100k or 1m expenses')
+        parser.add_argument('--expenses', type=int, help='Override the preset expense count')
+        parser.add_argument('--people', type=int, help='Override the preset people count')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per route')
+        parser.add_argument('--route', action='append', default=[],
+                            help='Only run routes whose label contains this text (repeatable)')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep the response cache between requests instead of clearing it')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Baseline JSON file to check the results against')
+        parser.add_argument('--max-latency-regression', type=float, default=0.25,
+                            help='Allowed relative p50 and p95 slowdown before a route fails (default 0.25)')
+        parser.add_argument('--min-latency-delta-ms', type=float, default=5.0,
+                            help='Ignore slowdowns smaller than this many ms (timer noise)')
+        parser.add_argument('--max-query-increase', type=int, default=0,
+                            help='Allowed extra SQL queries per request before a route fails')
+        parser.add_argument('--max-memory-regression', type=float, default=0.5,
+                            help='Allowed relative peak memory growth before a route fails')
+
+    def handle(self, *args, **options):
+        volumes = dict(PRESETS[options['preset']])
+        for key in ('expenses', 'people'):
+            if options[key] is not None:
+                volumes[key] = options[key]
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {e}")
+
+        old_name = connection.settings_dict['NAME']
+        tmpdir = None
+        if connection.vendor == 'sqlite':
+            # A file database so timings include real page reads, like production
+            tmpdir = tempfile.mkdtemp(prefix='budget-benchmark-')
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'benchmark.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(DEBUG=False):
+                results = self.run_benchmark(volumes, options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if tmpdir:
+                os.rmdir(tmpdir)
+
+        report = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'volumes': volumes,
+                'iterations': options['iterations'],
+                'warm_cache': options['warm_cache'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'routes': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if baseline is not None and not self.compare(baseline, report, options):
+            raise CommandError('Performance regressed against the baseline')
+
+    # Seeding
+
+    def seed(self, volumes, rng):
+        started = time.perf_counter()
+        user = User.objects.create_user(BENCH_USERNAME, password=BENCH_PASSWORD)
+        categories = [Category.objects.create(name=f'Category {i}') for i in range(12)]
+        today = date.today()
+
+        for months_back in range(12):
+            month = (today.replace(day=1) - timedelta(days=months_back * 31)).replace(day=1)
+            MonthlyBudget.objects.get_or_create(user=user, month=month, defaults={'amount': Decimal('25000.00')})
+
+        remaining = volumes['expenses']
+        while remaining:
+            count = min(SEED_BATCH, remaining)
+            remaining -= count
+            expenses = [
+                Expense(
+                    user=user,
+                    amount=Decimal(rng.randrange(100, 500000)) / 100,
+                    description=f'Expense {rng.randrange(1 << 20)}',
+                    category=rng.choice(categories),
+                    date=today - timedelta(days=rng.randrange(365)),
+                    payment_mode=rng.choice(['CASH', 'ONLINE']),
+                )
+                for _ in range(count)
+            ]
+            Expense.objects.bulk_create(expenses)
+            # Every expense has its ledger entry; Transaction.date is auto_now_add,
+            # so spread each batch over the year with one UPDATE
+            created = Transaction.objects.bulk_create([
+                Transaction(user=user, type='EXPENSE', amount=expense.amount, description=f'Expense: {expense.description}')
+                for expense in expenses
+            ])
+            moment = timezone.now() - timedelta(days=rng.randrange(365))
+            Transaction.objects.filter(id__in=[trans.id for trans in created]).update(date=moment)
+
+        spent = Transaction.objects.filter(user=user).aggregate(total=Sum('amount', default=0))['total']
+        Transaction.objects.create(user=user, type='ADD', amount=spent + Decimal('100000.00'), description='Opening balance')
+
+        people = Person.objects.bulk_create([
+            Person(user=user, name=f'Person {i}', relationship=rng.choice(['FAMILY', 'FRIEND', 'COLLEAGUE', 'BUSINESS', 'OTHER']))
+            for i in range(volumes['people'])
+        ], batch_size=SEED_BATCH)
+        remaining = volumes['people'] * 2
+        while remaining:
+            count = min(SEED_BATCH, remaining)
+            remaining -= count
+            PersonalTransaction.objects.bulk_create([
+                PersonalTransaction(
+                    user=user,
+                    person=rng.choice(people),
+                    type=rng.choice(['LENT', 'BORROWED', 'RECEIVED', 'PAID_BACK']),
+                    amount=Decimal(rng.randrange(100, 100000)) / 100,
+                    description='Seeded',
+                    date=today - timedelta(days=rng.randrange(365)),
+                    is_settled=rng.random() < 0.3,
+                )
+                for _ in range(count)
+            ])
+        PersonalRecord.objects.bulk_create([
+            PersonalRecord(user=user, type='EXPENSE', amount=Decimal('10.00'), description=f'Record {i}',
+                           date=today - timedelta(days=i % 365))
+            for i in range(min(volumes['expenses'], 1000))
+        ])
+
+        ledger = Transaction.objects.filter(user=user).aggregate(
+            credits=Sum('amount', filter=Q(type__in=['ADD', 'REFUND']), default=0),
+            debits=Sum('amount', filter=Q(type='EXPENSE'), default=0),
+        )
+        Wallet.objects.create(user=user, balance=ledger['credits'] - ledger['debits'])
+        rebuild_rollups(user)
+        self.stdout.write(
+            f"Seeded {volumes['expenses']} expenses and {volumes['people']} people "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        return user, categories[0], people[0]
+
+    # Routes
+
+    def routes(self, user, category, person):
+        """(label, method, build) for every route; build(i) does any untimed setup and returns (path, data)"""
+        today = date.today()
+
+        def fresh_expense():
+            return Expense.objects.create(user=user, amount=Decimal('1.00'), description='bench', category=category).id
+
+        def fixed(path, data=None):
+            return lambda i: (path, data)
+
+        def relogin(i):
+            self.client.force_login(user)
+            return '/api/logout/', None
+
+        return [
+            ('GET /api/', 'get', fixed('/api/')),
+            ('GET /api/categories/', 'get', fixed('/api/categories/')),
+            ('POST /api/categories/', 'post', lambda i: ('/api/categories/', {'name': f'Bench {i}'})),
+            ('GET /api/categories/<id>/', 'get', fixed(f'/api/categories/{category.id}/')),
+            ('GET /api/budgets/', 'get', fixed('/api/budgets/')),
+            ('POST /api/budgets/', 'post', fixed('/api/budgets/', {'amount': '30000', 'month': today.strftime('%Y-%m')})),
+            ('GET /api/budgets/<id>/', 'get', lambda i: (f"/api/budgets/{MonthlyBudget.objects.filter(user=user).values_list('id', flat=True).first()}/", None)),
+            ('GET /api/expenses/', 'get', fixed('/api/expenses/')),
+            ('GET /api/expenses/?page_size=50', 'get', fixed('/api/expenses/?page_size=50')),
+            ('POST /api/expenses/', 'post', fixed('/api/expenses/', {
+                'amount': '12.50', 'description': 'bench', 'category': category.id, 'date': today.isoformat(),
+            })),
+            ('GET /api/expenses/<id>/', 'get', lambda i: (f'/api/expenses/{fresh_expense()}/', None)),
+            ('PATCH /api/expenses/<id>/', 'patch', lambda i: (f'/api/expenses/{fresh_expense()}/', {'description': 'patched'})),
+            ('DELETE /api/expenses/<id>/', 'delete', lambda i: (f'/api/expenses/{fresh_expense()}/', None)),
+            ('POST /api/expenses/bulk/', 'post', fixed('/api/expenses/bulk/', [
+                {'amount': '3.00', 'description': f'bulk {n}', 'category': category.name} for n in range(50)
+            ])),
+            ('POST /api/expenses/bulk-delete/', 'post', lambda i: (
+                '/api/expenses/bulk-delete/', {'ids': [fresh_expense() for _ in range(5)]}
+            )),
+            ('GET /api/dashboard/', 'get', fixed('/api/dashboard/')),
+            ('POST /api/add-money/', 'post', fixed('/api/add-money/', {'amount': '10.00'})),
+            ('GET /api/transactions/', 'get', fixed('/api/transactions/')),
+            ('GET /api/monthly-analytics/', 'get', fixed('/api/monthly-analytics/')),
+            ('DELETE /api/expenses/<id>/delete/', 'delete', lambda i: (f'/api/expenses/{fresh_expense()}/delete/', None)),
+            ('PATCH /api/expenses/<id>/update-payment-mode/', 'patch', lambda i: (
+                f'/api/expenses/{fresh_expense()}/update-payment-mode/', {'payment_mode': 'ONLINE'}
+            )),
+            ('DELETE /api/transactions/<id>/delete/', 'delete', lambda i: (
+                f"/api/transactions/{Transaction.objects.create(user=user, type='ADD', amount=Decimal('1.00'), description='bench').id}/delete/",
+                None,
+            )),
+            ('GET /api/spending-insights/', 'get', fixed('/api/spending-insights/')),
+            ('GET /api/forecast/', 'get', fixed('/api/forecast/')),
+            ('GET /api/search/?q=<two words>', 'get', fixed('/api/search/?q=record+7')),
+            ('GET /api/monthly-reports/', 'get', fixed('/api/monthly-reports/')),
+            ('GET /api/download-report/<year>/<month>/', 'get', fixed(f'/api/download-report/{today.year}/{today.month}/')),
+            ('GET /api/download-report/<year>/<month>/?format=csv', 'get', fixed(f'/api/download-report/{today.year}/{today.month}/?format=csv')),
+            ('GET /api/export/?format=ndjson', 'get', fixed('/api/export/?format=ndjson')),
+            ('GET /api/timeseries/?granularity=day', 'get', fixed('/api/timeseries/?granularity=day')),
+            ('GET /api/timeseries/?granularity=month&start=<two years ago>', 'get', fixed(
+                f"/api/timeseries/?granularity=month&start={today.replace(year=today.year - 2, day=1).isoformat()}"
+            )),
+            ('POST /api/login/', 'post', fixed('/api/login/', {'username': BENCH_USERNAME, 'password': BENCH_PASSWORD})),
+            ('POST /api/logout/', 'post', relogin),
+            ('GET /api/check-auth/', 'get', fixed('/api/check-auth/')),
+            ('GET /api/people/', 'get', fixed('/api/people/')),
+            ('POST /api/people/', 'post', lambda i: ('/api/people/', {'name': f'Bench person {i}', 'relationship': 'FRIEND'})),
+            ('GET /api/people/<id>/', 'get', fixed(f'/api/people/{person.id}/')),
+            ('GET /api/personal-transactions/', 'get', fixed('/api/personal-transactions/')),
+            ('GET /api/personal-transactions/?page_size=50', 'get', fixed('/api/personal-transactions/?page_size=50')),
+            ('POST /api/personal-transactions/', 'post', fixed('/api/personal-transactions/', {
+                'person': person.id, 'type': 'LENT', 'amount': '5.00', 'description': 'bench', 'date': today.isoformat(),
+            })),
+            ('GET /api/personal-transactions/<id>/', 'get', lambda i: (
+                f"/api/personal-transactions/{PersonalTransaction.objects.filter(user=user).values_list('id', flat=True).first()}/",
+                None,
+            )),
+            ('GET /api/personal/dashboard/', 'get', fixed('/api/personal/dashboard/')),
+            ('GET /api/personal/person/<id>/', 'get', fixed(f'/api/personal/person/{person.id}/')),
+            ('POST /api/personal/person/<id>/settle/', 'post', fixed(f'/api/personal/person/{person.id}/settle/')),
+            ('GET /api/personal/reports/', 'get', fixed('/api/personal/reports/')),
+            ('POST /api/personal/verify-password/', 'post', fixed('/api/personal/verify-password/', {'password': 'wrong'})),
+            ('GET /api/personal/records/', 'get', fixed('/api/personal/records/')),
+            ('POST /api/personal/records/', 'post', fixed('/api/personal/records/', {
+                'type': 'EXPENSE', 'amount': '4.00', 'description': 'bench', 'date': today.isoformat(),
+            })),
+        ]
+
+    def uncovered_url_names(self, routes):
+        """URL names in budget/urls.py that no benchmark route resolves to"""
+        names = set()
+
+        def walk(patterns):
+            for pattern in patterns:
+                if isinstance(pattern, URLResolver):
+                    walk(pattern.url_patterns)
+                elif isinstance(pattern, URLPattern) and pattern.name:
+                    names.add(pattern.name)
+
+        walk(budget_urls.urlpatterns)
+        covered = set()
+        for label, method, build in routes:
+            path = label.split(' ', 1)[1].split('?')[0].replace('<id>', '1').replace('<year>', '2024').replace('<month>', '1')
+            covered.add(resolve(path).url_name)
+        return sorted(names - covered - SKIPPED_URL_NAMES)
+
+    # Measuring
+
+    def request(self, method, path, data):
+        kwargs = {'content_type': 'application/json'} if data is not None else {}
+        body = json.dumps(data) if data is not None else None
+        started = time.perf_counter()
+        if body is None:
+            response = getattr(self.client, method)(path)
+        else:
+            response = getattr(self.client, method)(path, body, **kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response, (time.perf_counter() - started) * 1000
+
+    def run_benchmark(self, volumes, options):
+        rng = random.Random(options['seed'])
+        user, category, person = self.seed(volumes, rng)
+        # Tests' client does not send If-None-Match, so every request runs the view
+        self.client = Client(raise_request_exception=False)
+        self.client.force_login(user)
+        cache = get_cache()
+
+        routes = self.routes(user, category, person)
+        for name in self.uncovered_url_names(routes):
+            self.stdout.write(self.style.WARNING(f"No benchmark route for URL '{name}'"))
+        if options['route']:
+            routes = [route for route in routes if any(text in route[0] for text in options['route'])]
+
+        results = {}
+        for label, method, build in routes:
+            timings = []
+            queries = []
+            status = None
+            # One untimed warm-up request, then the timed ones
+            for i in range(options['iterations'] + 1):
+                path, data = build(i)
+                if not options['warm_cache']:
+                    cache.clear()
+                # The query log is capped; start each request from an empty one
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as ctx:
+                    response, elapsed = self.request(method, path, data)
+                status = response.status_code
+                if i:
+                    timings.append(elapsed)
+                    queries.append(len(ctx))
+
+            # Memory is traced on a separate request so tracing does not skew the timings
+            path, data = build(options['iterations'] + 1)
+            if not options['warm_cache']:
+                cache.clear()
+            tracemalloc.start()
+            self.request(method, path, data)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            timings.sort()
+            result = {
+                'status': status,
+                'p50_ms': round(statistics.median(timings), 3),
+                'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+                'queries': max(queries),
+                'peak_memory_kb': round(peak / 1024, 1),
+            }
+            results[label] = result
+            line = (f"{label}: {status}, p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+                    f"{result['queries']} queries, peak {result['peak_memory_kb']:.0f} KiB")
+            self.stdout.write(self.style.ERROR(line) if status >= 500 else line)
+        return results
+
+    def compare(self, baseline, report, options):
+        """Print regressions against a baseline report; True when there are none"""
+        if baseline.get('meta', {}).get('volumes') != report['meta']['volumes']:
+            self.stdout.write(self.style.WARNING('Baseline was recorded with different data volumes'))
+        regressions = []
+        for label, current in report['routes'].items():
+            previous = baseline.get('routes', {}).get(label)
+            if not previous:
+                continue
+            # Both percentiles have to move, so one slow outlier is not a regression
+            if all(self.slower(previous[key], current[key], options) for key in ('p50_ms', 'p95_ms')):
+                regressions.append(
+                    f"{label}: p50 {previous['p50_ms']:.1f} -> {current['p50_ms']:.1f} ms, "
+                    f"p95 {previous['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms"
+                )
+            if current['queries'] > previous['queries'] + options['max_query_increase']:
+                regressions.append(f"{label}: {previous['queries']} -> {current['queries']} queries")
+            if current['peak_memory_kb'] > previous['peak_memory_kb'] * (1 + options['max_memory_regression']) + 64:
+                regressions.append(
+                    f"{label}: peak memory {previous['peak_memory_kb']:.0f} -> {current['peak_memory_kb']:.0f} KiB"
+                )
+            if current['status'] != previous['status'] and current['status'] >= 400:
+                regressions.append(f"{label}: status {previous['status']} -> {current['status']}")
+        for line in regressions:
+            self.stdout.write(self.style.ERROR(f"REGRESSION {line}"))
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+        return not regressions
+
+    def slower(self, previous, current, options):
+        delta = current - previous
+        return delta > options['min_latency_delta_ms'] and delta > previous * options['max_latency_regression']
@@ -0,0 +1,106 @@
+from datetime import date
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from budget.models import Person
+
+# GET endpoints whose queries are explained; {person} and {year}/{month} are
+# filled in from the user's data.
+ROUTES = [
+    '/api/dashboard/',
+    '/api/expenses/',
+    '/api/budgets/',
+    '/api/transactions/',
+    '/api/monthly-analytics/',
+    '/api/monthly-reports/',
+    '/api/spending-insights/',
+    '/api/forecast/',
+    '/api/search/?q=food',
+    '/api/download-report/{year}/{month}/',
+    '/api/timeseries/?granularity=month',
+    '/api/timeseries/?granularity=week&type=ADD',
+    '/api/people/',
+    '/api/personal-transactions/',
+    '/api/personal/dashboard/',
+    '/api/personal/person/{person}/',
+    '/api/personal/reports/',
+    '/api/personal/records/',
+]
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on every query issued by the API views and flag full table scans and filesorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='muskan', help='User whose data the views are run against')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan of every query')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if not user:
+            raise CommandError(f"User '{options['user']}' not found")
+
+        today = date.today()
+        person = Person.objects.filter(user=user).values_list('id', flat=True).first() or 0
+        client = Client()
+        client.force_login(user)
+
+        flagged = 0
+        for route in ROUTES:
+            url = route.format(year=today.year, month=today.month, person=person)
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get(url)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{url} -> {response.status_code}, {len(ctx)} queries"))
+
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT') or 'django_session' in sql:
+                    continue
+                plan, problems = self.explain(sql)
+                if problems:
+                    flagged += 1
+                    self.stdout.write(self.style.WARNING(f"  {'; '.join(problems)}"))
+                    self.stdout.write(f"    {sql[:300]}")
+                if options['verbose_plans'] or problems:
+                    for line in plan:
+                        self.stdout.write(f"      {line}")
+
+        client.logout()
+        if flagged:
+            self.stdout.write(self.style.ERROR(f'{flagged} queries scan or sort without an index'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Every query is served by an index'))
+
+    def explain(self, sql):
+        """Return (plan lines, problems) for a query on the current backend"""
+        problems = []
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+                for detail in plan:
+                    if detail.startswith('SCAN ') and 'CONSTANT ROW' not in detail:
+                        table = detail.split()[1]
+                        # Lookup tables such as categories are tiny and scanned on purpose;
+                        # an FTS5 "scan" with an M(atch) index reads only the matching rows
+                        if not table.startswith(('budget_category', 'sqlite_master')) and ':M' not in detail:
+                            problems.append(f"full scan: {detail}")
+                    # Sorting a handful of grouped rows, ranked matches or one user's
+                    # people (by balance) is cheap; sorting raw ledger rows is not
+                    cheap_sort = 'GROUP BY' in sql or ' MATCH ' in sql or 'FROM "budget_person"' in sql
+                    if 'USE TEMP B-TREE' in detail and not cheap_sort:
+                        problems.append(f"sort: {detail}")
+                return plan, problems
+
+            cursor.execute('EXPLAIN ' + sql)
+            columns = [col[0].lower() for col in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        plan = [', '.join(f"{k}={v}" for k, v in row.items() if v is not None) for row in rows]
+        for row in rows:
+            if str(row.get('type', '')).upper() == 'ALL':
+                problems.append(f"full scan: {row.get('table')}")
+            if 'filesort' in str(row.get('extra', '')).lower():
+                problems.append(f"filesort: {row.get('table')}")
+        return plan, problems
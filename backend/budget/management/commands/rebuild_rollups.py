@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from budget.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the MonthlyRollup table from raw Expense and Transaction history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild rollups for this username')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"User '{options['user']}' not found")
+
+        for user in users:
+            buckets = rebuild_rollups(user)
+            self.stdout.write(f"{user.username}: {buckets} rollup buckets rebuilt")
+        self.stdout.write(self.style.SUCCESS('Rollups rebuilt'))
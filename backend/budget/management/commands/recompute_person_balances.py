@@ -0,0 +1,55 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum
+from django.core.management.base import BaseCommand
+from budget import caching
+from budget.models import Person, PersonalTransaction, PERSON_BALANCE_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Verify the stored Person running totals against PersonalTransaction, optionally repairing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only check people tracked by this username')
+        parser.add_argument('--repair', action='store_true', help='Write the recomputed totals back')
+
+    def handle(self, *args, **options):
+        people = Person.objects.all()
+        transactions = PersonalTransaction.objects.all()
+        if options['user']:
+            people = people.filter(user__username=options['user'])
+            transactions = transactions.filter(user__username=options['user'])
+
+        expected = {}
+        rows = transactions.values_list('person_id', 'type').annotate(total=Sum('amount')).order_by()
+        for person_id, trans_type, total in rows:
+            field = PERSON_BALANCE_FIELDS.get(trans_type)
+            if field:
+                expected.setdefault(person_id, {})[field] = total
+
+        fields = list(PERSON_BALANCE_FIELDS.values())
+        drifted = []
+        for person in people.only('id', 'user_id', 'name', *fields).iterator():
+            totals = expected.get(person.id, {})
+            mismatched = [f for f in fields if getattr(person, f) != totals.get(f, Decimal('0'))]
+            if mismatched:
+                self.stdout.write(self.style.WARNING(
+                    f"{person.name} (#{person.id}): "
+                    + ', '.join(f"{f} {getattr(person, f)} != {totals.get(f, Decimal('0'))}" for f in mismatched)
+                ))
+                for f in fields:
+                    setattr(person, f, totals.get(f, Decimal('0')))
+                drifted.append(person)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All person balances match their transactions'))
+            return
+        if options['repair']:
+            with transaction.atomic():
+                Person.objects.bulk_update(drifted, fields, batch_size=500)
+                # bulk_update skips the signals that invalidate cached responses
+                for user_id in {person.user_id for person in drifted}:
+                    caching.bump_version(user_id)
+            self.stdout.write(self.style.SUCCESS(f'Repaired {len(drifted)} person balances'))
+        else:
+            self.stdout.write(self.style.ERROR(f'{len(drifted)} person balances drifted; rerun with --repair to fix'))
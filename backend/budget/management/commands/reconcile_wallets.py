@@ -0,0 +1,46 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from budget import wallets
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold new transactions into each wallet\'s reconciliation checkpoint and report wallets '
+        'whose stored balance differs from the ledger'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only reconcile this username')
+        parser.add_argument('--repair', action='store_true', help='Reset drifted balances to the ledger balance')
+        parser.add_argument('--full', action='store_true', help='Ignore the checkpoints and re-read every transaction')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if not user:
+                raise CommandError(f"User '{options['user']}' not found")
+            result = wallets.reconcile(user, repair=options['repair'], full=options['full'])
+            results = [result] if result else []
+        else:
+            results = wallets.reconcile_all(repair=options['repair'], full=options['full'])
+
+        usernames = dict(User.objects.values_list('id', 'username'))
+        checked = drifted = 0
+        for result in results:
+            checked += 1
+            name = usernames.get(result['user_id'], result['user_id'])
+            if not result['drift']:
+                self.stdout.write(f"{name}: {result['balance']} ok ({result['folded']} transactions folded in)")
+                continue
+            drifted += 1
+            line = f"{name}: wallet {result['balance']} != ledger {result['expected']} (drift {result['drift']:+})"
+            if result['repaired']:
+                self.stdout.write(self.style.WARNING(f"{line}, repaired"))
+            else:
+                self.stdout.write(self.style.ERROR(line))
+
+        summary = f"{checked} wallets checked, {drifted} drifted"
+        if drifted and not options['repair']:
+            self.stdout.write(self.style.ERROR(f"{summary}; run with --repair to fix them"))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
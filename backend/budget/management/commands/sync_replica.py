@@ -0,0 +1,46 @@
+import sqlite3
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from budget.db import replica_alias
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into the replica file (BUDGET_SQLITE_REPLICA_PATH), '
+        'once or every --interval seconds, for running the read replica locally'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None, help='Keep copying, this many seconds apart')
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError('No replica configured; set BUDGET_SQLITE_REPLICA_PATH')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError(f'sync_replica copies SQLite files; use {primary.vendor} replication instead')
+        target = connections[alias].settings_dict['NAME']
+
+        while True:
+            started = time.perf_counter()
+            pages = self.copy(primary, target)
+            self.stdout.write(
+                f"Copied {pages} pages to {target} in {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, primary, target):
+        """Snapshot the primary into `target` with SQLite's online backup; returns the page count"""
+        primary.ensure_connection()
+        copied = []
+        # Waits for the replica's readers; in WAL mode the primary's writers are never blocked
+        destination = sqlite3.connect(target, timeout=30)
+        try:
+            primary.connection.backup(destination, progress=lambda status, remaining, total: copied.append(total))
+        finally:
+            destination.close()
+        return copied[-1] if copied else 0
@@ -0,0 +1,171 @@
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count, Sum, Q
+from django.test import Client
+from django.test.utils import override_settings
+from budget import wallets
+from budget.models import Category, Expense, Transaction, Wallet, MonthlyRollup
+
+STRESS_USERNAME = 'muskan'
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer add_money, expense creation and expense deletion from many threads against a '
+        'throwaway test database and check that the wallet balance comes out exact'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=50, help='Operations per thread')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        old_name = connection.settings_dict['NAME']
+        tmpdir = None
+        if connection.vendor == 'sqlite':
+            # A file database, so every thread really gets its own connection
+            tmpdir = tempfile.mkdtemp(prefix='wallet-stress-')
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'stress.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Expected "database is locked" 500s would otherwise flood the output
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            # Only the wallet writes under test should contend; a session save
+            # failing after the view committed would make a success look like a failure
+            with override_settings(SESSION_SAVE_EVERY_REQUEST=False):
+                ok = self.run_stress(rng, options['threads'], options['operations'])
+        finally:
+            request_logger.setLevel(level)
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if tmpdir:
+                os.rmdir(tmpdir)
+        if not ok:
+            raise CommandError('Wallet balance drifted under concurrency')
+
+    def run_stress(self, rng, thread_count, operations):
+        user = User.objects.create_user(STRESS_USERNAME, password='stress')
+        category = Category.objects.create(name='Stress')
+        setup = Client()
+        setup.force_login(user)
+        setup.post('/api/add-money/', {'amount': '100000.00'}, content_type='application/json')
+
+        # Expenses every thread races to delete; each may be refunded only once
+        shared = []
+        for i in range(thread_count):
+            r = setup.post('/api/expenses/', {
+                'amount': '7.00', 'description': f'shared {i}', 'category': category.id,
+                'date': time.strftime('%Y-%m-%d'),
+            }, content_type='application/json')
+            shared.append((r.json()['id'], Decimal('7.00')))
+        start_balance = Wallet.objects.get(user=user).balance
+
+        results = []
+        lock = threading.Lock()
+        seeds = [rng.randrange(1 << 30) for _ in range(thread_count)]
+
+        def worker(seed):
+            local = random.Random(seed)
+            # The test client's exception capture is process-wide, so it would
+            # blame this thread for other threads' errors; rely on status codes
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            mine = []
+            outcome = {'added': Decimal('0'), 'spent': Decimal('0'), 'refunded': Decimal('0'), 'ok': 0, 'failed': 0}
+            for _ in range(operations):
+                op = local.choice(['add', 'expense', 'expense', 'delete', 'delete_shared'])
+                amount = Decimal(local.randrange(100, 5000)) / 100
+                if op == 'add':
+                    r = client.post('/api/add-money/', {'amount': str(amount)}, content_type='application/json')
+                    if r.status_code == 200:
+                        outcome['added'] += amount
+                elif op == 'expense':
+                    r = client.post('/api/expenses/', {
+                        'amount': str(amount), 'description': 'stress', 'category': category.id,
+                        'date': time.strftime('%Y-%m-%d'),
+                    }, content_type='application/json')
+                    if r.status_code == 201:
+                        outcome['spent'] += amount
+                        mine.append((r.json()['id'], amount))
+                else:
+                    if op == 'delete' and mine:
+                        expense_id, amount = mine.pop(local.randrange(len(mine)))
+                    else:
+                        expense_id, amount = local.choice(shared)
+                    r = client.delete(f'/api/expenses/{expense_id}/delete/')
+                    if r.status_code == 200:
+                        outcome['refunded'] += amount
+                # 5xx is e.g. "database is locked"; the request's transaction rolled back
+                outcome['ok' if r.status_code < 500 else 'failed'] += 1
+            connection.close()
+            with lock:
+                results.append(outcome)
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in seeds]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        added = sum(r['added'] for r in results)
+        spent = sum(r['spent'] for r in results)
+        refunded = sum(r['refunded'] for r in results)
+        failed = sum(r['failed'] for r in results)
+        expected = start_balance + added - spent + refunded
+
+        balance = Wallet.objects.get(user=user).balance
+        ledger = Transaction.objects.filter(user=user).aggregate(
+            credits=Sum('amount', filter=Q(type__in=['ADD', 'REFUND']), default=0),
+            debits=Sum('amount', filter=Q(type='EXPENSE'), default=0),
+        )
+        ledger_balance = ledger['credits'] - ledger['debits']
+        rollup = MonthlyRollup.objects.filter(user=user).aggregate(
+            spent=Sum('spent', default=0), income=Sum('income', default=0),
+            refunds=Sum('refunds', default=0), debits=Sum('debits', default=0),
+        )
+        expense_total = Expense.objects.filter(user=user).aggregate(total=Sum('amount', default=0))['total']
+        cents = Decimal('0.01')
+        rollup = {key: value.quantize(cents) for key, value in rollup.items()}
+        ledger_balance, expense_total = ledger_balance.quantize(cents), expense_total.quantize(cents)
+        rollup_balance = rollup['income'] + rollup['refunds'] - rollup['debits']
+        double_refunds = (
+            Transaction.objects.filter(user=user, type='REFUND', description__startswith='Refund: shared')
+            .values('description').annotate(n=Count('id')).filter(n__gt=1).count()
+        )
+
+        # The incremental reconciler must agree with the full-history ledger
+        reconciled = wallets.reconcile(user)
+
+        total_ops = thread_count * operations
+        self.stdout.write(f"{total_ops} operations on {thread_count} threads in {elapsed:.2f}s "
+                          f"({total_ops / elapsed:.0f} ops/s), {failed} failed and rolled back")
+        checks = [
+            ('wallet == opening + adds - expenses + refunds', balance, expected),
+            ('wallet == transaction ledger', balance, ledger_balance),
+            ('wallet == rollup ledger', balance, rollup_balance),
+            ('rollup spent == expense table', rollup['spent'], expense_total),
+            ('shared expenses refunded more than once', double_refunds, 0),
+            ('reconciler drift', reconciled['drift'], 0),
+        ]
+        ok = True
+        for label, actual, wanted in checks:
+            if actual == wanted:
+                self.stdout.write(self.style.SUCCESS(f"PASS {label}: {actual}"))
+            else:
+                ok = False
+                self.stdout.write(self.style.ERROR(f"FAIL {label}: {actual} != {wanted}"))
+        return ok
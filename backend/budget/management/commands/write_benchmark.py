@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from budget import wallets
+from budget.models import Category
+
+# What each profile is compared against: Django's own defaults
+UNTUNED = {
+    'sqlite': {
+        'BUDGET_SQLITE_PRAGMAS': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 5000},
+        'BUDGET_SQLITE_IMMEDIATE_TRANSACTIONS': False,
+    },
+    'mysql': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure write throughput of concurrent add-money and expense traffic against a throwaway '
+        'test database, with the database profile as configured and with Django\'s defaults'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', default='1,4,8', help='Comma-separated thread counts to run')
+        parser.add_argument('--operations', type=int, default=100, help='Requests per thread')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--output', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        try:
+            thread_counts = [int(n) for n in options['threads'].split(',')]
+        except ValueError:
+            raise CommandError('--threads takes comma-separated integers, e.g. 1,4,8')
+        if connection.vendor not in UNTUNED:
+            raise CommandError(f'No write benchmark for the {connection.vendor} backend')
+        rng = random.Random(options['seed'])
+
+        old_name = connection.settings_dict['NAME']
+        tmpdir = None
+        if connection.vendor == 'sqlite':
+            # A file database, so threads really contend for its lock
+            tmpdir = tempfile.mkdtemp(prefix='write-benchmark-')
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Expected "database is locked" 500s of the untuned runs would flood the output
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        results = []
+        try:
+            category = Category.objects.create(name='Benchmark')
+            with override_settings(SESSION_SAVE_EVERY_REQUEST=False):
+                for config in ('untuned', 'tuned'):
+                    for threads in thread_counts:
+                        with self.configured(config):
+                            result = self.run(rng, category, config, threads, options['operations'])
+                        results.append(result)
+                        self.report(result)
+        finally:
+            request_logger.setLevel(level)
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if tmpdir:
+                for name in os.listdir(tmpdir):
+                    os.remove(os.path.join(tmpdir, name))
+                os.rmdir(tmpdir)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if any(not result['balanced'] for result in results):
+            raise CommandError('A wallet did not match its ledger after the run')
+
+    @contextmanager
+    def configured(self, config):
+        """Apply one of the two configurations to the connections opened inside the block"""
+        connections.close_all()
+        saved = {}
+        override = None
+        if config == 'untuned' and connection.vendor == 'sqlite':
+            override = override_settings(**UNTUNED['sqlite'])
+            override.enable()
+        elif config == 'untuned':
+            saved = {key: connection.settings_dict[key] for key in UNTUNED['mysql']}
+            connection.settings_dict.update(UNTUNED['mysql'])
+        try:
+            yield
+        finally:
+            connections.close_all()
+            if override:
+                override.disable()
+            connection.settings_dict.update(saved)
+
+    def run(self, rng, category, config, thread_count, operations):
+        user = User.objects.create_user(f'bench-{config}-{thread_count}', password='bench')
+        latencies = []
+        failed = []
+        lock = threading.Lock()
+        seeds = [rng.randrange(1 << 30) for _ in range(thread_count)]
+        today = time.strftime('%Y-%m-%d')
+
+        def worker(seed):
+            local = random.Random(seed)
+            # Status codes only; the test client's exception capture is process-wide
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            mine, errors = [], 0
+            for _ in range(operations):
+                amount = str(Decimal(local.randrange(100, 5000)) / 100)
+                started = time.perf_counter()
+                if local.random() < 0.5:
+                    r = client.post('/api/add-money/', {'amount': amount}, content_type='application/json')
+                else:
+                    r = client.post('/api/expenses/', {
+                        'amount': amount, 'description': 'benchmark', 'category': category.id, 'date': today,
+                    }, content_type='application/json')
+                mine.append(time.perf_counter() - started)
+                if r.status_code >= 500:
+                    errors += 1
+            connections.close_all()
+            with lock:
+                latencies.extend(mine)
+                failed.append(errors)
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in seeds]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        failures = sum(failed)
+        total = thread_count * operations
+        reconciled = wallets.reconcile(user, full=True)
+        latencies.sort()
+        return {
+            'profile': getattr(settings, 'BUDGET_DB_PROFILE', connection.vendor),
+            'config': config,
+            'threads': thread_count,
+            'requests': total,
+            'failed': failures,
+            'writes_per_second': round((total - failures) / elapsed, 1),
+            'p50_ms': round(statistics.median(latencies) * 1000, 1),
+            'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+            'balanced': not reconciled['drift'],
+        }
+
+    def report(self, result):
+        line = (
+            f"{result['profile']} {result['config']:<8} {result['threads']:>3} threads: "
+            f"{result['writes_per_second']:>7} writes/s, p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+            f"{result['failed']}/{result['requests']} failed"
+        )
+        if result['failed'] or not result['balanced']:
+            self.stdout.write(self.style.WARNING(line + ('' if result['balanced'] else ', WALLET DRIFTED')))
+        else:
+            self.stdout.write(self.style.SUCCESS(line))
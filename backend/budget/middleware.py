@@ -1,7 +1,220 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import ExitStack
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import parse_etags
+from .caching import read_from_replica, request_change_token
 
 class DisableCSRFMiddleware(MiddlewareMixin):
     def process_request(self, request):
         if request.path.startswith('/api/'):
             setattr(request, '_dont_enforce_csrf_checks', True)
-        return None
\ No newline at end of file
+        return None
+
+class UserCache:
+    """Small per-process LRU of User rows keyed by id (or by username for the demo fallback).
+
+    Entries expire after `ttl` seconds so other processes' edits are picked up
+    eventually; in this process the User signals in signals.py evict them at once.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+        user = load()
+        if user is not None:
+            with self._lock:
+                self._entries[key] = (user, now + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return user
+
+    def by_id(self, user_id):
+        return self._get(('id', str(user_id)), lambda: User.objects.filter(pk=user_id).first())
+
+    def by_username(self, username):
+        return self._get(('username', username), lambda: User.objects.filter(username=username).first())
+
+    def invalidate(self, user):
+        with self._lock:
+            self._entries.pop(('id', str(user.pk)), None)
+            self._entries.pop(('username', user.username), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache(
+    maxsize=getattr(settings, 'BUDGET_USER_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'BUDGET_USER_CACHE_TTL', 300),
+)
+
+def resolve_budget_user(request):
+    """The account a request acts on: the logged-in user, else the configured demo account"""
+    session = getattr(request, 'session', None)
+    user_id = session.get(SESSION_KEY) if session is not None else None
+    if user_id is not None:
+        user = user_cache.by_id(user_id)
+        # Same check django.contrib.auth.get_user() does, so a password change
+        # still logs out other sessions
+        if user and user.is_active and constant_time_compare(
+            session.get(HASH_SESSION_KEY, ''), user.get_session_auth_hash()
+        ):
+            return user, True
+    username = getattr(settings, 'BUDGET_DEFAULT_USERNAME', None)
+    if username:
+        return user_cache.by_username(username), False
+    return None, False
+
+class BudgetUserMiddleware(MiddlewareMixin):
+    """Resolve the acting user once per request and expose it as `request.budget_user`"""
+
+    def process_request(self, request):
+        user, authenticated = resolve_budget_user(request)
+        request.budget_user = user
+        if authenticated:
+            # Hand the same object to AuthenticationMiddleware's lazy request.user
+            request._cached_user = user
+        return None
+
+class BudgetETagMiddleware(MiddlewareMixin):
+    """Weak ETags for GET requests under /api/, answered with 304 before the view runs.
+
+    The tag is derived from the user's change token (budget.caching), so it is
+    known without touching the database; goes after BudgetUserMiddleware.
+    """
+
+    def process_request(self, request):
+        user = getattr(request, 'budget_user', None)
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith('/api/') or user is None:
+            return None
+        token = request_change_token(request, user)
+        # The same URL differs per user, per login state and per negotiated format
+        authenticated = getattr(request, '_cached_user', None) is not None
+        source = f"{user.pk}:{authenticated}:{token}:{request.get_full_path()}:{request.META.get('HTTP_ACCEPT', '')}"
+        request.budget_etag = 'W/"%s"' % hashlib.md5(source.encode()).hexdigest()
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            wanted = request.budget_etag[2:]
+            if any(tag == '*' or tag.removeprefix('W/') == wanted for tag in parse_etags(if_none_match)):
+                response = HttpResponseNotModified()
+                self._add_headers(request, response)
+                return response
+        return None
+
+    def process_response(self, request, response):
+        if (
+            getattr(request, 'budget_etag', None) and response.status_code == 200
+            and not response.has_header('ETag') and not read_from_replica(request)
+        ):
+            self._add_headers(request, response)
+        return response
+
+    def _add_headers(self, request, response):
+        response['ETag'] = request.budget_etag
+        # Let browsers keep the body but revalidate it on every poll
+        patch_cache_control(response, private=True, no_cache=True)
+
+slow_request_logger = logging.getLogger('budget.slow_requests')
+
+class SQLInstrumentationMiddleware:
+    """Opt-in (BUDGET_SQL_INSTRUMENTATION) per-request SQL profiling.
+
+    Adds a Server-Timing header with query count, DB, view and render time,
+    and writes slow requests and repeated identical statements (N+1 loops)
+    with their SQL to the `budget.slow_requests` log. Queries run while a
+    streaming response is being consumed, or on the worker threads of
+    budget.async_views, are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'BUDGET_SQL_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'BUDGET_SLOW_REQUEST_MS', 500)
+        self.repeat_threshold = getattr(settings, 'BUDGET_REPEATED_QUERY_THRESHOLD', 5)
+
+    def __call__(self, request):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append((sql, params, (time.perf_counter() - started) * 1000))
+
+        started = time.perf_counter()
+        request._instrumentation = {}
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        marks = request._instrumentation
+        view_ms = render_ms = None
+        if 'view_started' in marks:
+            view_ended = marks.get('view_ended', time.perf_counter())
+            view_ms = (view_ended - marks['view_started']) * 1000
+            render_ms = (time.perf_counter() - view_ended) * 1000 if 'view_ended' in marks else 0.0
+        db_ms = sum(duration for _, _, duration in queries)
+        repeated = [(sql, count) for sql, count in Counter(sql for sql, _, _ in queries).most_common()
+                    if count >= self.repeat_threshold]
+
+        timings = [f'db;dur={db_ms:.1f};desc="{len(queries)} queries"']
+        if view_ms is not None:
+            timings.append(f'view;dur={view_ms:.1f}')
+            timings.append(f'render;dur={render_ms:.1f}')
+        if repeated:
+            timings.append(f'repeated;desc="{len(repeated)} statements run {self.repeat_threshold}+ times"')
+        timings.append(f'total;dur={total_ms:.1f}')
+        response['Server-Timing'] = ', '.join(timings)
+
+        if total_ms >= self.slow_ms or repeated:
+            self.log(request, response, total_ms, db_ms, queries, repeated)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._instrumentation['view_started'] = time.perf_counter()
+        return None
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this hook; everything since is render time
+        request._instrumentation['view_ended'] = time.perf_counter()
+        return response
+
+    def log(self, request, response, total_ms, db_ms, queries, repeated):
+        lines = [
+            f"{request.method} {request.get_full_path()} -> {response.status_code} in {total_ms:.1f} ms, "
+            f"{len(queries)} queries in {db_ms:.1f} ms"
+        ]
+        for sql, count in repeated:
+            lines.append(f"  repeated {count}x (possible N+1): {sql}")
+        if total_ms >= self.slow_ms:
+            for sql, params, duration in sorted(queries, key=lambda query: query[2], reverse=True)[:10]:
+                lines.append(f"  {duration:.1f} ms: {sql} {str(params)[:200]}")
+        slow_request_logger.warning('\n'.join(lines))
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('budget', '0007_expense_payment_mode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('payment_mode', models.CharField(blank=True, default='', max_length=10)),
+                ('spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expense_count', models.IntegerField(default=0)),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('income_count', models.IntegerField(default=0)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refund_count', models.IntegerField(default=0)),
+                ('debits', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('debit_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='budget.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', False)), fields=('user', 'month', 'category', 'payment_mode'), name='unique_expense_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('user', 'month'), name='unique_transaction_rollup'),
+        ),
+    ]
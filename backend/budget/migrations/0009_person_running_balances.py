@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:20
+
+from django.db import migrations, models
+
+
+def backfill_person_balances(apps, schema_editor):
+    Person = apps.get_model('budget', 'Person')
+    PersonalTransaction = apps.get_model('budget', 'PersonalTransaction')
+    fields = {'LENT': 'lent', 'RECEIVED': 'received', 'BORROWED': 'borrowed', 'PAID_BACK': 'paid_back'}
+
+    totals = {}
+    rows = (
+        PersonalTransaction.objects.values_list('person_id', 'type')
+        .annotate(total=models.Sum('amount'))
+        .order_by()
+    )
+    for person_id, trans_type, total in rows:
+        if trans_type in fields:
+            totals.setdefault(person_id, {})[fields[trans_type]] = total
+    for person_id, values in totals.items():
+        Person.objects.filter(pk=person_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0008_monthlyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='borrowed',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='lent',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='paid_back',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='received',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_person_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0009_person_running_balances'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['user', 'date', 'created_at'], name='expense_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='monthlyrollup',
+            index=models.Index(fields=['user', 'month'], name='rollup_user_month_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personalrecord',
+            index=models.Index(fields=['user', 'date'], name='record_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personaltransaction',
+            index=models.Index(fields=['user', 'person', 'type'], name='ptx_user_person_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personaltransaction',
+            index=models.Index(fields=['user', 'date', 'created_at'], name='ptx_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personaltransaction',
+            index=models.Index(condition=models.Q(('is_settled', False)), fields=['user', 'due_date'], name='ptx_user_due_unsettled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'type', 'date'], name='transaction_user_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date'], name='transaction_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0010_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='reconciled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='reconciled_balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='reconciled_transaction_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations, OperationalError
+
+# Frozen copies of budget.fulltext.SEARCH_TABLE and SOURCES
+SEARCH_TABLE = 'budget_search'
+SOURCES = [
+    ('expense', 'Expense'),
+    ('transaction', 'Transaction'),
+    ('personal_transaction', 'PersonalTransaction'),
+    ('personal_record', 'PersonalRecord'),
+]
+
+
+def create_search_index(apps, schema_editor):
+    """FTS5 index over every description, kept in sync by triggers (SQLite only)"""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        # rowid = source row id * len(SOURCES) + source code, so triggers reach
+        # a row by rowid
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+                f"description, user_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2', prefix = '3')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5; budget.fulltext falls back to LIKE
+            return
+        for code, (source, model_name) in enumerate(SOURCES):
+            table = apps.get_model('budget', model_name)._meta.db_table
+            rowid = f"{{row}}.id * {len(SOURCES)} + {code}"
+            insert = (
+                f"INSERT INTO {SEARCH_TABLE}(rowid, description, user_id) "
+                f"VALUES ({rowid.format(row='new')}, new.description, new.user_id);"
+            )
+            delete = f"DELETE FROM {SEARCH_TABLE} WHERE rowid = {rowid.format(row='old')};"
+            cursor.execute(f"CREATE TRIGGER {SEARCH_TABLE}_{source}_ai AFTER INSERT ON {table} BEGIN {insert} END")
+            cursor.execute(f"CREATE TRIGGER {SEARCH_TABLE}_{source}_ad AFTER DELETE ON {table} BEGIN {delete} END")
+            cursor.execute(
+                f"CREATE TRIGGER {SEARCH_TABLE}_{source}_au AFTER UPDATE OF description, user_id ON {table} "
+                f"BEGIN {delete} {insert} END"
+            )
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE}(rowid, description, user_id) "
+                f"SELECT id * {len(SOURCES)} + {code}, description, user_id FROM {table}"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for source, _ in SOURCES:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_{source}_{suffix}")
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0011_wallet_reconciliation_checkpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+from django.db.models import Q, Sum
+
+
+def store_ledger_balance(apps, schema_editor):
+    """Wallets used to clamp every debit at zero; store the ledger net they are now kept at"""
+    Wallet = apps.get_model('budget', 'Wallet')
+    Transaction = apps.get_model('budget', 'Transaction')
+    for wallet in Wallet.objects.all():
+        ledger = Transaction.objects.filter(user_id=wallet.user_id).aggregate(
+            credits=Sum('amount', filter=Q(type__in=['ADD', 'REFUND'])),
+            debits=Sum('amount', filter=Q(type='EXPENSE')),
+        )
+        balance = (ledger['credits'] or 0) - (ledger['debits'] or 0)
+        Wallet.objects.filter(pk=wallet.pk).update(balance=balance)
+
+
+def floor_balance(apps, schema_editor):
+    apps.get_model('budget', 'Wallet').objects.filter(balance__lt=0).update(balance=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0012_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(store_ledger_balance, floor_balance),
+    ]
@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import make_password, check_password
+from . import caching
 
 class Category(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -14,8 +15,15 @@ class Category(models.Model):
 
 class Wallet(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
+    # Credits minus debits of the user's ledger; below zero after overspending,
+    # shown floored at zero (wallets.get_balance)
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     updated_at = models.DateTimeField(auto_now=True)
+    # Reconciliation checkpoint: the ledger balance of every transaction up to
+    # and including reconciled_transaction_id (see wallets.reconcile)
+    reconciled_transaction_id = models.BigIntegerField(default=0)
+    reconciled_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.user.username} - ${self.balance}"
@@ -51,6 +59,9 @@ class Expense(models.Model):
 
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['user', 'date', 'created_at'], name='expense_user_date_idx'),
+        ]
 
 class Transaction(models.Model):
     TRANSACTION_TYPES = [
@@ -70,6 +81,10 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['user', 'type', 'date'], name='transaction_user_type_date_idx'),
+            models.Index(fields=['user', 'date'], name='transaction_user_date_idx'),
+        ]
 
 class Person(models.Model):
     RELATIONSHIP_CHOICES = [
@@ -87,21 +102,92 @@ class Person(models.Model):
     phone = models.CharField(max_length=20, blank=True, null=True)
     email = models.EmailField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Running totals of this person's PersonalTransactions, kept in step by
+    # adjust_person_balances(); `recompute_person_balances` repairs drift.
+    lent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    received = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    borrowed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid_back = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     
     def __str__(self):
         return f"{self.name} ({self.relationship})"
     
     def get_balance(self):
-        lent = PersonalTransaction.objects.filter(person=self, type='LENT').aggregate(models.Sum('amount'))['amount__sum'] or 0
-        received = PersonalTransaction.objects.filter(person=self, type='RECEIVED').aggregate(models.Sum('amount'))['amount__sum'] or 0
-        borrowed = PersonalTransaction.objects.filter(person=self, type='BORROWED').aggregate(models.Sum('amount'))['amount__sum'] or 0
-        paid_back = PersonalTransaction.objects.filter(person=self, type='PAID_BACK').aggregate(models.Sum('amount'))['amount__sum'] or 0
-        return (lent - received) - (borrowed - paid_back)
+        return (self.lent - self.received) - (self.borrowed - self.paid_back)
     
     class Meta:
         unique_together = ['user', 'name']
         ordering = ['name']
 
+def person_balance():
+    """Person.get_balance() as a database expression, for annotating and sorting"""
+    return models.ExpressionWrapper(
+        (models.F('lent') - models.F('received')) - (models.F('borrowed') - models.F('paid_back')),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+# PersonalTransaction type -> running total field on Person
+PERSON_BALANCE_FIELDS = {
+    'LENT': 'lent',
+    'RECEIVED': 'received',
+    'BORROWED': 'borrowed',
+    'PAID_BACK': 'paid_back',
+}
+
+def adjust_person_balances(rows, sign=1):
+    """Apply (person_id, type, amount) rows to the Person running totals with F() updates"""
+    deltas = {}
+    for person_id, trans_type, amount in rows:
+        field = PERSON_BALANCE_FIELDS.get(trans_type)
+        if field and amount:
+            person_deltas = deltas.setdefault(person_id, {})
+            person_deltas[field] = person_deltas.get(field, 0) + amount
+    for person_id, fields in deltas.items():
+        Person.objects.filter(pk=person_id).update(
+            **{field: models.F(field) + sign * amount for field, amount in fields.items()}
+        )
+
+class PersonalTransactionQuerySet(models.QuerySet):
+    """Keeps Person running totals correct for bulk writes, which skip model signals"""
+    BALANCE_FIELDS = {'person', 'person_id', 'type', 'amount'}
+
+    def _balance_rows(self, pks):
+        return (
+            self.model._base_manager.filter(pk__in=pks)
+            .values_list('person_id', 'type')
+            .annotate(total=models.Sum('amount'))
+            .order_by()
+        )
+
+    def update(self, **kwargs):
+        if not self.BALANCE_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            adjust_person_balances(self._balance_rows(pks), sign=-1)
+            user_ids = self._owners(pks)
+            rows = super().update(**kwargs)
+            adjust_person_balances(self._balance_rows(pks))
+            # A reassigned user sees the change too
+            self._bump_versions(user_ids | self._owners(pks))
+        return rows
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            adjust_person_balances((obj.person_id, obj.type, obj.amount) for obj in objs)
+            self._bump_versions({obj.user_id for obj in objs})
+        return objs
+
+    def _owners(self, pks):
+        return set(self.model._base_manager.filter(pk__in=pks).values_list('user_id', flat=True).distinct())
+
+    def _bump_versions(self, user_ids):
+        # The totals changed without the signals that invalidate cached responses
+        for user_id in user_ids:
+            caching.bump_version(user_id)
+
 class PersonalTransaction(models.Model):
     TRANSACTION_TYPES = [
         ('LENT', 'Money Lent'),
@@ -121,11 +207,23 @@ class PersonalTransaction(models.Model):
     is_settled = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = PersonalTransactionQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.user.username} - {self.type} - {self.person.name} - ₹{self.amount}"
     
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['user', 'person', 'type'], name='ptx_user_person_type_idx'),
+            models.Index(fields=['user', 'date', 'created_at'], name='ptx_user_date_idx'),
+            # Outstanding dues only; partial indexes are skipped on MySQL
+            models.Index(
+                fields=['user', 'due_date'],
+                condition=models.Q(is_settled=False),
+                name='ptx_user_due_unsettled_idx',
+            ),
+        ]
 
 class PersonalRecord(models.Model):
     RECORD_TYPES = [
@@ -148,4 +246,47 @@ class PersonalRecord(models.Model):
         return f"{self.user.username} - {self.type} - ₹{self.amount}"
     
     class Meta:
-        ordering = ['-date', '-created_at']
\ No newline at end of file
+        ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['user', 'date'], name='record_user_date_idx'),
+        ]
+
+class MonthlyRollup(models.Model):
+    """Per-user monthly totals kept in step with Expense and Transaction writes.
+
+    Expense rows are bucketed by (month, category, payment_mode); wallet
+    transactions carry no category and land in the row with a null category.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    month = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, blank=True, null=True)
+    payment_mode = models.CharField(max_length=10, blank=True, default='')
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expense_count = models.IntegerField(default=0)
+    income = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    income_count = models.IntegerField(default=0)
+    refunds = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refund_count = models.IntegerField(default=0)
+    debits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    debit_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.month.strftime('%B %Y')} - ${self.spent}"
+
+    class Meta:
+        ordering = ['-month']
+        indexes = [
+            models.Index(fields=['user', 'month'], name='rollup_user_month_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'month', 'category', 'payment_mode'],
+                condition=models.Q(category__isnull=False),
+                name='unique_expense_rollup',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'month'],
+                condition=models.Q(category__isnull=True),
+                name='unique_transaction_rollup',
+            ),
+        ]
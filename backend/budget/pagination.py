@@ -0,0 +1,158 @@
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over the full ordering tuple, e.g. (-date, -created_at, id).
+
+    Each page is fetched with a `WHERE (date, created_at, id) < (...)` style
+    predicate instead of OFFSET, and no COUNT(*) is issued, so deep pages cost
+    the same as the first one. Cursors are opaque base64 tokens.
+
+    Lists stay unpaginated unless PAGE_SIZE is configured or the client sends
+    ?page_size= or ?cursor=, which keeps existing clients working.
+    """
+    page_size = api_settings.PAGE_SIZE
+    default_cursor_page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    # Defaults to the model's Meta.ordering with `id` appended as a tie-breaker
+    ordering = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.cursor = self.decode_cursor(request)
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.ordering = self.get_ordering(queryset)
+        reverse = bool(self.cursor and self.cursor['r'])
+        if self.cursor:
+            if len(self.cursor['p']) != len(self.ordering):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                queryset = queryset.filter(self.keyset_filter(self.cursor['p'], reverse))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+        order_by = [self.flip(field) for field in self.ordering] if reverse else self.ordering
+
+        results = list(queryset.order_by(*order_by)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        if self.page_size_query_param in request.query_params:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+            except ValueError:
+                size = 0
+            if size > 0:
+                return min(size, self.max_page_size)
+        if self.page_size:
+            return self.page_size
+        if self.cursor:
+            return self.default_cursor_page_size
+        return None
+
+    def get_ordering(self, queryset):
+        if self.ordering:
+            return list(self.ordering)
+        ordering = [field for field in queryset.model._meta.ordering if field.lstrip('-') != 'id']
+        return ordering + ['id']
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.position(self.page[0]), reverse=True)
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def position(self, item):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            value = item[name] if isinstance(item, dict) else getattr(item, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def keyset_filter(self, position, reverse):
+        """Rows strictly after `position` in ordering (or before it when reverse)"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = f"{name}__lt" if descending else f"{name}__gt"
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'), default=str)
+        token = base64.urlsafe_b64encode(payload.encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            if not isinstance(cursor.get('p'), list):
+                raise ValueError
+            cursor['r'] = bool(cursor.get('r'))
+            return cursor
+        except (AttributeError, TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -0,0 +1,151 @@
+import threading
+from contextlib import contextmanager
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .models import Expense, Transaction, MonthlyRollup
+
+# Transaction type -> (amount field, count field) on MonthlyRollup
+TRANSACTION_FIELDS = {
+    'ADD': ('income', 'income_count'),
+    'REFUND': ('refunds', 'refund_count'),
+    'EXPENSE': ('debits', 'debit_count'),
+}
+
+_state = threading.local()
+
+
+@contextmanager
+def suspended():
+    """Mute the per-row rollup signal handlers; the caller applies the deltas in bulk"""
+    previous = is_suspended()
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def is_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+def month_of(value):
+    """First day of the month for a date or (aware) datetime"""
+    if hasattr(value, 'hour'):
+        value = timezone.localtime(value) if timezone.is_aware(value) else value
+        value = value.date()
+    return value.replace(day=1)
+
+
+def bump(user_id, month, category_id=None, payment_mode='', **deltas):
+    """Add deltas to a single rollup bucket, creating it on first positive write"""
+    lookup = {
+        'user_id': user_id,
+        'month': month,
+        'category_id': category_id,
+        'payment_mode': payment_mode if category_id else '',
+    }
+    changes = {field: F(field) + value for field, value in deltas.items()}
+    if MonthlyRollup.objects.filter(**lookup).update(**changes):
+        return
+    # A missing bucket can only be created by an additive write; subtracting
+    # from a bucket that was never recorded means the rollup is already out of
+    # sync and `rebuild_rollups` has to repair it.
+    if any(value < 0 for value in deltas.values()):
+        return
+    try:
+        with transaction.atomic():
+            MonthlyRollup.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Lost the race to create the bucket
+        MonthlyRollup.objects.filter(**lookup).update(**changes)
+
+
+def apply_expense(expense, sign=1):
+    bump(
+        expense.user_id,
+        month_of(expense.date),
+        expense.category_id,
+        expense.payment_mode,
+        spent=sign * expense.amount,
+        expense_count=sign,
+    )
+
+
+def apply_transaction(trans, sign=1):
+    fields = TRANSACTION_FIELDS.get(trans.type)
+    if not fields:
+        return
+    amount_field, count_field = fields
+    bump(trans.user_id, month_of(trans.date), **{amount_field: sign * trans.amount, count_field: sign})
+
+
+def apply_expenses(expenses, sign=1):
+    """Fold many expenses into their buckets with one UPDATE per bucket (for bulk writes)"""
+    buckets = {}
+    for expense in expenses:
+        key = (expense.user_id, month_of(expense.date), expense.category_id, expense.payment_mode)
+        spent, count = buckets.get(key, (0, 0))
+        buckets[key] = (spent + expense.amount, count + 1)
+    for (user_id, month, category_id, payment_mode), (spent, count) in buckets.items():
+        bump(user_id, month, category_id, payment_mode, spent=sign * spent, expense_count=sign * count)
+
+
+def apply_transactions(transactions, sign=1):
+    """Bulk counterpart of apply_transaction()"""
+    buckets = {}
+    for trans in transactions:
+        fields = TRANSACTION_FIELDS.get(trans.type)
+        if not fields:
+            continue
+        deltas = buckets.setdefault((trans.user_id, month_of(trans.date)), {})
+        amount_field, count_field = fields
+        deltas[amount_field] = deltas.get(amount_field, 0) + sign * trans.amount
+        deltas[count_field] = deltas.get(count_field, 0) + sign
+    for (user_id, month), deltas in buckets.items():
+        bump(user_id, month, **deltas)
+
+
+def rebuild_rollups(user):
+    """Recompute every rollup bucket for a user from the raw Expense/Transaction history"""
+    rows = {}
+
+    expense_buckets = (
+        Expense.objects.filter(user=user)
+        .annotate(bucket=TruncMonth('date'))
+        .values('bucket', 'category_id', 'payment_mode')
+        .annotate(spent=Sum('amount'), expense_count=Count('id'))
+        .order_by()
+    )
+    for bucket in expense_buckets:
+        key = (month_of(bucket['bucket']), bucket['category_id'], bucket['payment_mode'])
+        rows[key] = MonthlyRollup(
+            user=user,
+            month=key[0],
+            category_id=key[1],
+            payment_mode=key[2],
+            spent=bucket['spent'],
+            expense_count=bucket['expense_count'],
+        )
+
+    aggregates = {}
+    for trans_type, (amount_field, count_field) in TRANSACTION_FIELDS.items():
+        aggregates[amount_field] = Sum('amount', filter=Q(type=trans_type), default=0)
+        aggregates[count_field] = Count('id', filter=Q(type=trans_type))
+    transaction_buckets = (
+        Transaction.objects.filter(user=user)
+        .annotate(bucket=TruncMonth('date'))
+        .values('bucket')
+        .annotate(**aggregates)
+        .order_by()
+    )
+    for bucket in transaction_buckets:
+        month = month_of(bucket.pop('bucket'))
+        rows[(month, None, '')] = MonthlyRollup(user=user, month=month, **bucket)
+
+    with transaction.atomic():
+        MonthlyRollup.objects.filter(user=user).delete()
+        MonthlyRollup.objects.bulk_create(rows.values())
+    return len(rows)
@@ -16,7 +16,16 @@ class MonthlyBudgetSerializer(serializers.ModelSerializer):
         model = MonthlyBudget
         fields = ['id', 'month', 'amount', 'created_at']
 
-class ExpenseSerializer(serializers.ModelSerializer):
+class SparseFieldsModelSerializer(serializers.ModelSerializer):
+    """Takes an optional `fields` argument and drops every other field"""
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class ExpenseSerializer(SparseFieldsModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     category_icon = serializers.CharField(source='category.icon', read_only=True)
     category_color = serializers.CharField(source='category.color', read_only=True)
@@ -34,6 +43,14 @@ class AddMoneySerializer(serializers.Serializer):
     amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0.01)
     description = serializers.CharField(max_length=200, default="Added money")
 
+class BulkExpenseRowSerializer(serializers.Serializer):
+    """One row of a bulk expense import; category may be a name or an id"""
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0.01)
+    description = serializers.CharField(max_length=200)
+    category = serializers.CharField(max_length=50)
+    date = serializers.DateField(required=False)
+    payment_mode = serializers.ChoiceField(choices=Expense.PAYMENT_MODES, default='CASH')
+
 class PersonSerializer(serializers.ModelSerializer):
     balance = serializers.SerializerMethodField()
     
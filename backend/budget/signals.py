@@ -1,21 +1,117 @@
-from django.db.models.signals import post_delete
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Transaction, Wallet
+from .models import Category, MonthlyBudget, Expense, Transaction, Person, PersonalTransaction, PersonalRecord, adjust_person_balances
+from .middleware import user_cache
+from . import caching, rollups, wallets
 
 @receiver(post_delete, sender=Transaction)
 def update_wallet_on_transaction_delete(sender, instance, **kwargs):
-    """Update wallet balance when transaction is deleted from admin"""
-    try:
-        wallet, created = Wallet.objects.get_or_create(user=instance.user)
-        
-        # Reverse the transaction effect on wallet
-        if instance.type == 'ADD':
-            # If it was an ADD transaction, subtract from wallet
-            wallet.balance = max(0, wallet.balance - instance.amount)
-        else:  # EXPENSE
-            # If it was an EXPENSE transaction, add back to wallet
-            wallet.balance += instance.amount
-        
-        wallet.save()
-    except Exception as e:
-        print(f"Error updating wallet on transaction delete: {e}")
\ No newline at end of file
+    """Reverse a deleted transaction's effect on the wallet (views and admin alike)"""
+    wallets.reverse_transaction(instance)
+
+@receiver(post_save, sender=Transaction)
+def reconcile_wallet_after_write(sender, instance, created, raw=False, **kwargs):
+    """Advance the wallet's reconciliation checkpoint after each write, if enabled"""
+    if created and not raw and getattr(settings, 'BUDGET_RECONCILE_AFTER_WRITES', False):
+        transaction.on_commit(lambda: wallets.reconcile(instance.user_id))
+
+# Monthly rollups run inside the caller's DB transaction, so a rolled back
+# write never leaves its totals behind.
+
+def _remember_previous(sender, instance, fields):
+    instance._previous_values = None
+    if instance.pk and not instance._state.adding:
+        instance._previous_values = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+@receiver(pre_save, sender=Expense)
+def remember_expense_before_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _remember_previous(sender, instance, ['user_id', 'amount', 'date', 'category_id', 'payment_mode'])
+
+@receiver(post_save, sender=Expense)
+def update_rollup_on_expense_save(sender, instance, raw=False, **kwargs):
+    if raw or rollups.is_suspended():
+        return
+    previous = getattr(instance, '_previous_values', None)
+    if previous:
+        rollups.apply_expense(Expense(**previous), sign=-1)
+    rollups.apply_expense(instance)
+
+@receiver(post_delete, sender=Expense)
+def update_rollup_on_expense_delete(sender, instance, **kwargs):
+    if rollups.is_suspended():
+        return
+    rollups.apply_expense(instance, sign=-1)
+
+@receiver(pre_save, sender=Transaction)
+def remember_transaction_before_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _remember_previous(sender, instance, ['user_id', 'type', 'amount', 'date'])
+
+@receiver(post_save, sender=Transaction)
+def update_rollup_on_transaction_save(sender, instance, raw=False, **kwargs):
+    if raw or rollups.is_suspended():
+        return
+    previous = getattr(instance, '_previous_values', None)
+    if previous:
+        rollups.apply_transaction(Transaction(**previous), sign=-1)
+    rollups.apply_transaction(instance)
+
+@receiver(post_delete, sender=Transaction)
+def update_rollup_on_transaction_delete(sender, instance, **kwargs):
+    if rollups.is_suspended():
+        return
+    rollups.apply_transaction(instance, sign=-1)
+
+# Person running totals follow every PersonalTransaction write; bulk
+# update()/bulk_create() are covered by PersonalTransactionQuerySet.
+
+@receiver(pre_save, sender=PersonalTransaction)
+def remember_personal_transaction_before_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _remember_previous(sender, instance, ['person_id', 'type', 'amount'])
+
+@receiver(post_save, sender=PersonalTransaction)
+def update_person_balance_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_values', None)
+    if previous:
+        adjust_person_balances([(previous['person_id'], previous['type'], previous['amount'])], sign=-1)
+    adjust_person_balances([(instance.person_id, instance.type, instance.amount)])
+
+@receiver(post_delete, sender=PersonalTransaction)
+def update_person_balance_on_delete(sender, instance, **kwargs):
+    adjust_person_balances([(instance.person_id, instance.type, instance.amount)], sign=-1)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_cached_user(sender, instance, **kwargs):
+    """Keep BudgetUserMiddleware from serving a stale or deleted user"""
+    user_cache.invalidate(instance)
+
+# Cached analytics responses and API ETags are keyed by a per-user data
+# version; any write to the data they are computed from moves the version on.
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_save, sender=MonthlyBudget)
+@receiver(post_delete, sender=MonthlyBudget)
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+@receiver(post_save, sender=PersonalTransaction)
+@receiver(post_delete, sender=PersonalTransaction)
+@receiver(post_save, sender=PersonalRecord)
+@receiver(post_delete, sender=PersonalRecord)
+def bump_cached_data_version(sender, instance, **kwargs):
+    caching.bump_version(instance.user_id)
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_cached_category_version(sender, instance, **kwargs):
+    caching.bump_category_version()
@@ -1,3 +1,861 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from . import caching, db, forecasting, fulltext, insights, wallets
+from .middleware import user_cache
+from .models import Category, Expense, MonthlyBudget, MonthlyRollup, Person, PersonalTransaction, Wallet
+from .rollups import rebuild_rollups
 
-# Create your tests here.
+ROLLUP_FIELDS = [
+    'spent', 'expense_count', 'income', 'income_count', 'refunds', 'refund_count', 'debits', 'debit_count',
+]
+
+
+class BudgetTestCase(TestCase):
+    """A logged-in user with a funded wallet; caches start empty and on_commit callbacks run"""
+
+    def setUp(self):
+        # The cache and the user cache outlive each test's rolled back database
+        caching.get_cache().clear()
+        user_cache.clear()
+        self.user = User.objects.create_user('tester', password='tester')
+        self.client.force_login(self.user)
+        self.food = Category.objects.create(name='Food')
+        self.travel = Category.objects.create(name='Travel')
+        self.today = date.today()
+        self.last_month = (self.today.replace(day=1) - timedelta(days=1)).replace(day=1)
+        self.request('post', '/api/add-money/', {'amount': '1000.00'})
+
+    def request(self, method, url, data=None, status=None):
+        """Make an API call with its on-commit callbacks (cache version bumps) run"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, content_type='application/json')
+        if status is not None:
+            self.assertEqual(response.status_code, status, response.content)
+        return response
+
+    def add_expense(self, amount='25.00', category=None, day=None, payment_mode='CASH', description='lunch'):
+        return self.request('post', '/api/expenses/', {
+            'amount': amount,
+            'description': description,
+            'category': (category or self.food).id,
+            'date': (day or self.today).isoformat(),
+            'payment_mode': payment_mode,
+        }, status=201).json()
+
+    def create_expenses(self, rows):
+        """Expense rows only, from (amount, day, category, description) tuples; no ledger, wallet or rollups"""
+        Expense.objects.bulk_create([
+            Expense(user=self.user, amount=amount, date=day, category=category, description=description)
+            for amount, day, category, description in rows
+        ])
+
+    def rollups(self):
+        """The user's rollup buckets, leaving out the empty ones a rebuild would not create"""
+        rows = MonthlyRollup.objects.filter(user=self.user).values('month', 'category_id', 'payment_mode', *ROLLUP_FIELDS)
+        return {
+            (row['month'], row['category_id'], row['payment_mode']): tuple(row[field] for field in ROLLUP_FIELDS)
+            for row in rows
+            if any(row[field] for field in ROLLUP_FIELDS)
+        }
+
+    def assertMatchesRebuild(self):
+        maintained = self.rollups()
+        rebuild_rollups(self.user)
+        self.assertEqual(maintained, self.rollups())
+
+
+class RollupTests(BudgetTestCase):
+    def test_patch_moving_an_expense_to_another_bucket(self):
+        expense = self.add_expense()
+        self.add_expense('10.00')
+        self.request('patch', f"/api/expenses/{expense['id']}/", {
+            'date': self.last_month.isoformat(), 'category': self.travel.id, 'payment_mode': 'ONLINE',
+        }, status=200)
+        self.assertMatchesRebuild()
+
+    def test_bulk_import_and_bulk_delete(self):
+        self.request('post', '/api/expenses/bulk/', [
+            {'amount': '12.50', 'description': 'bus', 'category': 'Travel', 'date': self.today.isoformat()},
+            {'amount': '40.00', 'description': 'dinner', 'category': 'Food', 'date': self.last_month.isoformat(),
+             'payment_mode': 'ONLINE'},
+            {'amount': '7.25', 'description': 'snack', 'category': 'food'},
+        ], status=201)
+        self.assertMatchesRebuild()
+
+        self.request('post', '/api/expenses/bulk-delete/', {'category': 'Food'}, status=200)
+        self.assertMatchesRebuild()
+
+    def test_single_deletes(self):
+        expense = self.add_expense()
+        self.request('delete', f"/api/expenses/{expense['id']}/delete/", status=200)
+        transaction_id = self.user.transaction_set.filter(type='ADD').values_list('id', flat=True).first()
+        self.request('delete', f'/api/transactions/{transaction_id}/delete/', status=200)
+        self.assertMatchesRebuild()
+
+
+class PersonBalanceTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.asha = Person.objects.create(user=self.user, name='Asha')
+        self.ravi = Person.objects.create(user=self.user, name='Ravi')
+        for person, trans_type, amount in [
+            (self.asha, 'LENT', 50), (self.asha, 'RECEIVED', 20), (self.ravi, 'BORROWED', 30), (self.ravi, 'LENT', 5),
+        ]:
+            PersonalTransaction.objects.create(
+                user=self.user, person=person, type=trans_type, amount=amount, description='test'
+            )
+
+    def assertMatchesRecompute(self):
+        out = StringIO()
+        call_command('recompute_person_balances', stdout=out)
+        self.assertIn('All person balances match', out.getvalue())
+
+    def test_save_and_delete(self):
+        trans = PersonalTransaction.objects.filter(person=self.asha, type='LENT').get()
+        trans.amount = 80
+        trans.person = self.ravi
+        trans.save()
+        PersonalTransaction.objects.filter(type='RECEIVED').get().delete()
+        self.assertMatchesRecompute()
+
+    def test_queryset_update(self):
+        PersonalTransaction.objects.filter(type='LENT').update(amount=70)
+        self.assertMatchesRecompute()
+        PersonalTransaction.objects.filter(person=self.ravi).update(type='PAID_BACK')
+        self.assertMatchesRecompute()
+        PersonalTransaction.objects.filter(person=self.asha).update(person=self.ravi)
+        self.assertMatchesRecompute()
+        self.asha.refresh_from_db()
+        self.assertEqual(self.asha.get_balance(), 0)
+
+    def test_bulk_create(self):
+        PersonalTransaction.objects.bulk_create([
+            PersonalTransaction(user=self.user, person=self.asha, type='LENT', amount=5, description='bulk'),
+            PersonalTransaction(user=self.user, person=self.ravi, type='PAID_BACK', amount=12, description='bulk'),
+        ])
+        self.assertMatchesRecompute()
+
+
+class BulkExpenseTests(BudgetTestCase):
+    def test_import(self):
+        response = self.request('post', '/api/expenses/bulk/', {'expenses': [
+            {'amount': '12.50', 'description': 'bus', 'category': 'Travel', 'date': self.today.isoformat()},
+            {'amount': '40.00', 'description': 'dinner', 'category': self.food.id, 'payment_mode': 'ONLINE'},
+            {'amount': '7.25', 'description': 'snack', 'category': 'food', 'date': self.last_month.isoformat()},
+        ]}, status=201).json()
+        self.assertEqual((response['created'], response['total'], response['errors']), (3, 59.75, []))
+        self.assertEqual(response['new_balance'], 940.25)
+        self.assertEqual(wallets.get_balance(self.user), Decimal('940.25'))
+        self.assertEqual(self.user.expense_set.count(), 3)
+        self.assertEqual(self.user.transaction_set.filter(type='EXPENSE').count(), 3)
+        self.assertMatchesRebuild()
+
+    def test_import_validation(self):
+        self.request('post', '/api/expenses/bulk/', [], status=400)
+        self.request('post', '/api/expenses/bulk/', {'expenses': 'nope'}, status=400)
+        with patch('budget.views.BULK_IMPORT_MAX_ROWS', 2):
+            row = {'amount': '1.00', 'description': 'x', 'category': 'Food'}
+            self.request('post', '/api/expenses/bulk/', [row] * 3, status=400)
+
+        # Bad rows are reported and skipped; the rest are imported
+        response = self.request('post', '/api/expenses/bulk/', [
+            {'amount': '10.00', 'description': 'ok', 'category': 'Food'},
+            {'amount': '5.00', 'description': 'where', 'category': 'Rent'},
+            {'amount': '-3.00', 'description': 'negative', 'category': 'Food'},
+        ], status=201).json()
+        self.assertEqual(response['created'], 1)
+        self.assertEqual([error['row'] for error in response['errors']], [2, 3])
+        self.assertIn('category', response['errors'][0]['errors'])
+
+        # Nothing valid: nothing is written
+        self.request('post', '/api/expenses/bulk/', [
+            {'amount': '5.00', 'description': 'where', 'category': 'Rent'},
+        ], status=400)
+        self.assertEqual(wallets.get_balance(self.user), Decimal('990.00'))
+        self.assertMatchesRebuild()
+
+    def test_delete(self):
+        first = self.add_expense('10.00')
+        self.add_expense('20.00', day=self.last_month)
+        self.add_expense('30.00', category=self.travel)
+        self.add_expense('40.00', category=self.travel, payment_mode='ONLINE')
+
+        response = self.request('post', '/api/expenses/bulk-delete/', {'ids': [first['id']]}, status=200).json()
+        self.assertEqual((response['deleted'], response['refunded'], response['new_balance']), (1, 10.0, 910.0))
+        response = self.request('post', '/api/expenses/bulk-delete/', {
+            'category': 'travel', 'payment_mode': 'CASH',
+        }, status=200).json()
+        self.assertEqual((response['deleted'], response['refunded']), (1, 30.0))
+        response = self.request('post', '/api/expenses/bulk-delete/', {
+            'date_to': (self.today.replace(day=1) - timedelta(days=1)).isoformat(),
+        }, status=200).json()
+        self.assertEqual((response['deleted'], response['refunded']), (1, 20.0))
+
+        self.assertEqual(wallets.get_balance(self.user), Decimal('960.00'))
+        self.assertEqual(list(self.user.expense_set.values_list('amount', flat=True)), [Decimal('40.00')])
+        self.assertEqual(self.user.transaction_set.filter(type='REFUND').count(), 3)
+        self.assertEqual(wallets.reconcile(self.user, full=True)['drift'], 0)
+        self.assertMatchesRebuild()
+
+    def test_delete_validation(self):
+        self.add_expense('10.00')
+        self.request('post', '/api/expenses/bulk-delete/', [1, 2, 3], status=400)
+        self.request('post', '/api/expenses/bulk-delete/', {}, status=400)
+        self.request('post', '/api/expenses/bulk-delete/', {'ids': 5}, status=400)
+        self.request('post', '/api/expenses/bulk-delete/', {'date_from': '01/02/2024'}, status=400)
+        response = self.request('post', '/api/expenses/bulk-delete/', {'category': 'Travel'}, status=200).json()
+        self.assertEqual(response['deleted'], 0)
+        self.assertEqual(self.user.expense_set.count(), 1)
+
+
+class ExportTests(BudgetTestCase):
+    def export(self, query='', status=200):
+        response = self.client.get(f'/api/export/{query}')
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_formats(self):
+        self.add_expense('25.00')
+        response = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'record,date,type,amount,description,category,payment_mode')
+        # The top-up and the expense's ledger row, then the expense itself
+        self.assertEqual(len(lines), 4)
+
+        response = self.export('?format=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(sorted(record['record'] for record in records), ['expense', 'transaction', 'transaction'])
+
+    def test_rejected_requests(self):
+        # Content negotiation turns away unknown formats before the view runs
+        self.export('?format=xml', status=404)
+        self.export('?start=2024-13-01', status=400)
+
+
+@override_settings(SESSION_SAVE_EVERY_REQUEST=False)
+class QueryCountTests(BudgetTestCase):
+    """Personal views issue a fixed number of queries however many people a user tracks"""
+
+    def add_people(self, count):
+        known = Person.objects.filter(user=self.user).count()
+        for person in Person.objects.bulk_create([
+            Person(user=self.user, name=f'Person {known + n}', relationship='FRIEND') for n in range(count)
+        ]):
+            PersonalTransaction.objects.create(user=self.user, person=person, type='LENT', amount=5, description='x')
+
+    def assertViewQueries(self, count, url):
+        # Cached responses would skip the queries being counted
+        caching.get_cache().clear()
+        # Plus loading the session
+        with self.assertNumQueries(count + 1):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_people(self):
+        for people in (3, 17):
+            self.add_people(people)
+            self.assertViewQueries(1, '/api/people/')
+            self.assertViewQueries(2, '/api/personal/dashboard/')
+
+
+class KeysetPaginationTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        for amount in range(1, 8):
+            self.add_expense(f'{amount}.00')
+        self.add_expense('8.00', day=self.last_month)
+        # Every expense of today ties on (date, created_at); only id tells them apart
+        Expense.objects.filter(date=self.today).update(created_at=timezone.now())
+        # The ordering: -date, -created_at, then id
+        self.ids = list(Expense.objects.order_by('-date', '-created_at', 'id').values_list('id', flat=True))
+
+    def walk(self, url, link):
+        """Follow `link` ('next' or 'previous') from `url`; returns the ids of each page"""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([expense['id'] for expense in response.json()['results']])
+            url = response.json()[link]
+        return pages
+
+    def cursor(self, expense_id, reverse=False):
+        """The token KeysetPagination issues for a page boundary at this expense"""
+        expense = Expense.objects.get(id=expense_id)
+        position = [expense.date.isoformat(), expense.created_at.isoformat(), expense.id]
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def test_walk_forward_and_back(self):
+        forward = self.walk('/api/expenses/?page_size=3', 'next')
+        self.assertEqual([len(page) for page in forward], [3, 3, 2])
+        self.assertEqual(sum(forward, []), self.ids)
+
+        last = self.client.get(f'/api/expenses/?page_size=3&cursor={self.cursor(self.ids[5])}').json()
+        self.assertEqual([expense['id'] for expense in last['results']], self.ids[6:])
+        self.assertIsNone(last['next'])
+        backward = self.walk(last['previous'], 'previous')
+        self.assertEqual(sum(reversed(backward), []), self.ids[:6])
+        self.assertEqual(backward[0], self.ids[3:6])
+
+    def test_cursor_encoding(self):
+        response = self.client.get('/api/expenses/?page_size=2').json()
+        self.assertIsNone(response['previous'])
+        token = parse_qs(urlparse(response['next']).query)['cursor'][0]
+        self.assertEqual(token, self.cursor(self.ids[1]))
+        self.assertEqual(json.loads(base64.urlsafe_b64decode(token))['r'], 0)
+
+        # Without page_size or cursor the list is not paginated
+        self.assertEqual(len(self.client.get('/api/expenses/').json()), len(self.ids))
+
+    def test_invalid_cursor(self):
+        for token in [
+            'not-base64!',
+            base64.urlsafe_b64encode(b'{"r":0}').decode(),
+            base64.urlsafe_b64encode(b'{"p":[1],"r":0}').decode(),
+            base64.urlsafe_b64encode(b'{"p":["someday","now",1],"r":0}').decode(),
+        ]:
+            self.assertEqual(self.client.get(f'/api/expenses/?cursor={token}').status_code, 404, token)
+
+
+@override_settings(SESSION_SAVE_EVERY_REQUEST=False)
+class ETagTests(BudgetTestCase):
+    def test_revalidation(self):
+        response = self.client.get('/api/dashboard/')
+        etag = response['ETag']
+        self.assertRegex(etag, r'^W/"[0-9a-f]{32}"$')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        # Answered before the view runs, after loading only the session; the
+        # strong form, lists of tags and * match too
+        with self.assertNumQueries(1):
+            not_modified = self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((not_modified.status_code, not_modified['ETag']), (304, etag))
+        self.assertEqual(self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=f'"x", {etag[2:]}').status_code, 304)
+        self.assertEqual(self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH='*').status_code, 304)
+        self.assertEqual(self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH='"x"').status_code, 200)
+
+    def test_tags_differ_per_url_format_and_user(self):
+        etag = self.client.get('/api/dashboard/')['ETag']
+        self.assertNotEqual(self.client.get('/api/monthly-reports/')['ETag'], etag)
+        self.assertNotEqual(self.client.get('/api/dashboard/', HTTP_ACCEPT='text/html')['ETag'], etag)
+
+        other = User.objects.create_user('other', password='other')
+        self.client.force_login(other)
+        response = self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_writes_get_no_tag(self):
+        etag = self.client.get('/api/dashboard/')['ETag']
+        response = self.request('post', '/api/add-money/', {'amount': '5.00'}, status=200)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class TimeSeriesTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        for amount, day, category in [
+            ('10.00', date(2024, 1, 30), self.food),
+            ('20.00', date(2024, 2, 1), self.food),
+            ('30.00', date(2024, 2, 5), self.travel),
+            ('40.00', date(2024, 2, 29), self.food),
+        ]:
+            self.add_expense(amount, category=category, day=day)
+
+    def series(self, query):
+        response = self.client.get(f'/api/timeseries/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_buckets(self):
+        # The first week is rounded down to its Monday, so it holds the 30th
+        weeks = self.series('granularity=week&start=2024-01-31&end=2024-02-11')
+        self.assertEqual(
+            [(point['bucket'], point['total'], point['count']) for point in weeks['series']],
+            [('2024-01-29', 30.0, 2), ('2024-02-05', 30.0, 1)],
+        )
+        months = self.series('granularity=month&start=2024-01-01&end=2024-03-31')
+        self.assertEqual([point['total'] for point in months['series']], [10.0, 90.0, 0.0])
+        self.assertEqual((months['total'], months['count']), (100.0, 4))
+
+        days = self.series('start=2024-02-01&end=2024-02-05&category=travel')
+        self.assertEqual([point['total'] for point in days['series']], [0.0, 0.0, 0.0, 0.0, 30.0])
+        self.assertEqual(days['category'], 'Travel')
+
+    def test_ledger_types(self):
+        today = self.today.isoformat()
+        added = self.series(f'type=ADD&start={today}&end={today}')
+        self.assertEqual(added['series'], [{'bucket': today, 'total': 1000.0, 'count': 1}])
+        # Ledger rows are dated when they are written, not by the expense date
+        spent = self.series(f'type=EXPENSE&start={today}&end={today}')
+        self.assertEqual((spent['total'], spent['count'], spent['type']), (100.0, 4, 'EXPENSE'))
+
+    def test_invalid_requests(self):
+        for query in [
+            'granularity=year',
+            'start=2024-02-02&end=2024-02-01',
+            'start=2024-02-30',
+            'start=1990-01-01&end=2024-01-01',
+            'type=GIFT',
+            'payment_mode=CHEQUE',
+            'category=Rent',
+            'type=ADD&category=Food',
+        ]:
+            self.assertEqual(self.client.get(f'/api/timeseries/?{query}').status_code, 400, query)
+
+
+class InsightsTests(BudgetTestCase):
+    def test_anomalies_and_week_over_week(self):
+        today = date(2024, 6, 30)
+        start = today - timedelta(days=insights.BASELINE_DAYS + insights.RECENT_DAYS - 1)
+        days = [start + timedelta(days=n) for n in range((today - start).days + 1)]
+        self.create_expenses(
+            [(100 if day == date(2024, 6, 25) else 10, day, self.food, 'groceries') for day in days]
+            # Too few spending days in its baseline to be judged
+            + [(20, start + timedelta(days=n), self.travel, 'bus') for n in (10, 40, 70)]
+            + [(200, date(2024, 6, 28), self.travel, 'flight')]
+        )
+
+        result = insights.spending_anomalies(self.user, today)
+        self.assertEqual(len(result['anomalies']), 1)
+        anomaly = result['anomalies'][0]
+        self.assertEqual(
+            (anomaly['category'], anomaly['date'], anomaly['amount'], anomaly['usual']),
+            ('Food', '2024-06-25', 100.0, 10.0),
+        )
+        # A steady category's spread is floored at a quarter of its mean
+        self.assertEqual(anomaly['zscore'], 36.0)
+        self.assertEqual(
+            [(change['category'], change['change'], change['change_pct']) for change in result['week_over_week']],
+            [('Travel', 200.0, None), ('Food', 90.0, 128.6)],
+        )
+
+    def test_too_little_history(self):
+        self.assertEqual(insights.analyse([], np.zeros((0, 10)), self.today), {'anomalies': [], 'week_over_week': []})
+        self.create_expenses([(500, date(2024, 6, 29), self.food, 'party')])
+        self.assertEqual(insights.spending_anomalies(self.user, date(2024, 6, 30))['anomalies'], [])
+
+
+class ForecastTests(BudgetTestCase):
+    def test_projection(self):
+        misc = Category.objects.create(name='Misc')
+        rows = []
+        for month in [date(2023, 12, 1)] + [date(2024, n, 1) for n in range(1, 6)]:
+            rows += [
+                # Food: half of a steady month's spend on the 1st, half on the 20th
+                (50, month, self.food, 'groceries'),
+                (50, month.replace(day=20), self.food, 'groceries'),
+                (15, month.replace(day=5), self.travel, 'Metro pass'),
+            ]
+        # This month so far: Food on its usual pace, Misc with no history
+        rows += [(50, date(2024, 6, 1), self.food, 'groceries')]
+        rows += [(3, date(2024, 6, day), misc, 'snacks') for day in (1, 2, 3)]
+        self.create_expenses(rows)
+        MonthlyBudget.objects.create(user=self.user, month=date(2024, 6, 1), amount=150)
+
+        result = forecasting.forecast(self.user, date(2024, 6, 3))
+        categories = {item['category']: item for item in result['categories']}
+        self.assertEqual(
+            {name: (item['spent'], item['projected']) for name, item in categories.items()},
+            {'Food': (50.0, 100.0), 'Misc': (9.0, 90.0), 'Travel': (0.0, 15.0)},
+        )
+        self.assertEqual(
+            categories['Travel']['recurring'],
+            [{'description': 'Metro pass', 'amount': 15.0, 'day': 5, 'charged': False}],
+        )
+        # Twice a month is not a recurring charge
+        self.assertEqual((categories['Food']['recurring'], categories['Food']['usual_monthly']), ([], 100.0))
+        self.assertEqual((result['spent'], result['projected']), (59.0, 205.0))
+        self.assertEqual((result['projected_remaining_budget'], result['overrun_date']), (-55.0, '2024-06-20'))
+
+    def test_no_expenses(self):
+        result = forecasting.forecast(self.user, date(2024, 6, 3))
+        self.assertEqual((result['projected'], result['categories'], result['overrun_date']), (0.0, [], None))
+        response = self.client.get('/api/forecast/')
+        self.assertEqual((response.status_code, response.json()['month']), (200, self.today.strftime('%Y-%m')))
+
+
+class SearchTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.groceries = self.add_expense('30.00', description='Weekly groceries at the market')
+        self.add_expense('12.00', description='Market snacks', day=self.last_month)
+        self.person = Person.objects.create(user=self.user, name='Asha')
+        PersonalTransaction.objects.create(
+            user=self.user, person=self.person, type='LENT', amount=40, description='Groceries for Asha'
+        )
+        other = User.objects.create_user('other')
+        Expense.objects.create(user=other, amount=5, description='groceries', category=self.food)
+
+    def search(self, query):
+        response = self.client.get('/api/search/', {'q': query})
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted((result['source'], result['description']) for result in response.json()['results'])
+
+    def test_index_follows_writes(self):
+        self.assertTrue(fulltext.fts_available())
+        # Each source's rows sit at rowid = id * 4 + the source's position
+        expense_id = self.groceries['id']
+        ledger_id = self.user.transaction_set.get(description='Expense: Weekly groceries at the market').id
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid, description FROM budget_search WHERE rowid IN (%s, %s) ORDER BY rowid',
+                [expense_id * 4, ledger_id * 4 + 1],
+            )
+            self.assertEqual(sorted(cursor.fetchall()), sorted([
+                (expense_id * 4, 'Weekly groceries at the market'),
+                (ledger_id * 4 + 1, 'Expense: Weekly groceries at the market'),
+            ]))
+
+        self.assertEqual(self.search('groceries'), [
+            ('expense', 'Weekly groceries at the market'),
+            ('personal_transaction', 'Groceries for Asha'),
+            ('transaction', 'Expense: Weekly groceries at the market'),
+        ])
+        self.request('patch', f'/api/expenses/{expense_id}/', {'description': 'Weekly vegetables'}, status=200)
+        # The ledger row keeps the description it was written with
+        self.assertEqual(self.search('weekly'), [
+            ('expense', 'Weekly vegetables'), ('transaction', 'Expense: Weekly groceries at the market'),
+        ])
+        self.assertEqual(self.search('vegetables'), [('expense', 'Weekly vegetables')])
+        self.assertEqual(self.search('groceries market'), [('transaction', 'Expense: Weekly groceries at the market')])
+        PersonalTransaction.objects.filter(person=self.person).delete()
+        self.assertEqual(self.search('asha'), [])
+
+    def test_prefix_and_every_word(self):
+        # The last word is a prefix from three characters on
+        self.assertEqual(len(self.search('gro')), 3)
+        self.assertEqual(self.search('gr'), [])
+        self.assertEqual(self.search('market snac'), [('expense', 'Market snacks'), ('transaction', 'Expense: Market snacks')])
+
+    def test_like_fallback(self):
+        with_fts = self.search('market')
+        with patch.dict(fulltext._fts_available, {connection.alias: False}):
+            self.assertEqual(self.search('market'), with_fts)
+            response = self.client.get('/api/search/', {'q': 'market', 'page_size': 1}).json()
+            # Newest first, unranked
+            self.assertEqual([result['score'] for result in response['results']], [None])
+            self.assertTrue(response['results'][0]['date'].startswith(self.today.isoformat()))
+            self.assertIsNotNone(response['next'])
+
+    def test_invalid_requests(self):
+        for query in ['', '?!', 'market&page=0', 'market&page_size=x']:
+            self.assertEqual(self.client.get(f'/api/search/?q={query}').status_code, 400, query)
+
+
+@override_settings(SESSION_SAVE_EVERY_REQUEST=False)
+class ExpenseFilterTests(BudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_expense('10.00', description='tea')
+        self.add_expense('20.00', category=self.travel, payment_mode='ONLINE', description='bus')
+        self.add_expense('30.00', day=self.last_month, description='dinner')
+
+    def descriptions(self, query):
+        response = self.client.get(f'/api/expenses/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(expense['description'] for expense in response.json())
+
+    def test_filters(self):
+        self.assertEqual(self.descriptions('category=food'), ['dinner', 'tea'])
+        self.assertEqual(self.descriptions(f'category={self.travel.id}'), ['bus'])
+        self.assertEqual(self.descriptions('payment_mode=ONLINE'), ['bus'])
+        self.assertEqual(self.descriptions('min_amount=15&max_amount=25'), ['bus'])
+        self.assertEqual(self.descriptions(f'date_to={self.last_month.isoformat()}'), ['dinner'])
+        self.assertEqual(self.descriptions(f'date_from={self.today.isoformat()}&category=Food'), ['tea'])
+        for query in ['date_from=yesterday', 'min_amount=lots', 'fields=id,secret']:
+            self.assertEqual(self.client.get(f'/api/expenses/?{query}').status_code, 400, query)
+
+    def test_sparse_fields(self):
+        [bus] = self.client.get('/api/expenses/?fields=id,amount,category_name&payment_mode=ONLINE').json()
+        self.assertEqual((sorted(bus), bus['amount'], bus['category_name']), (['amount', 'category_name', 'id'], '20.00', 'Travel'))
+        # Loading the session, then one query reading only the columns asked for
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/expenses/?fields=id,amount')
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('description', queries[1]['sql'])
+        self.assertNotIn('budget_category', queries[1]['sql'])
+        # Writes still answer with every field
+        expense = self.request('patch', f"/api/expenses/{bus['id']}/?fields=id", {'amount': '21.00'}, status=200)
+        self.assertEqual(expense.json()['description'], 'bus')
+
+
+class ReplicaTests(BudgetTestCase):
+    """Routing to a replica, here played by the primary itself under the alias 'default'"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch('budget.db.replica_alias', return_value=DEFAULT_DB_ALIAS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def forget_writes(self):
+        caching.get_cache().delete(caching.RECENT_WRITE_KEY.format(user_id=self.user.pk))
+
+    def call(self, view):
+        request = RequestFactory().get('/api/monthly-reports/')
+        request.budget_user = self.user
+        return request, view(request)
+
+    def test_router(self):
+        router = db.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Expense))
+        token = db._read_alias.set('replica')
+        try:
+            self.assertEqual(router.db_for_read(Expense), 'replica')
+            self.assertEqual(router.db_for_write(Expense), DEFAULT_DB_ALIAS)
+        finally:
+            db._read_alias.reset(token)
+        with patch('budget.db.replica_alias', return_value='replica'):
+            self.assertFalse(router.allow_migrate('replica', 'budget'))
+            self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'budget'))
+
+    def test_sticky_reads_after_a_write(self):
+        view = db.read_replica(lambda request: db.read_alias())
+        # setUp just added money
+        request, alias = self.call(view)
+        self.assertIsNone(alias)
+        self.assertFalse(caching.read_from_replica(request))
+
+        self.forget_writes()
+        request, alias = self.call(view)
+        self.assertEqual(alias, DEFAULT_DB_ALIAS)
+        self.assertTrue(caching.read_from_replica(request))
+        self.assertIsNone(db.read_alias())
+
+    def test_falls_back_to_the_primary(self):
+        aliases = []
+
+        def view(request):
+            aliases.append(db.read_alias())
+            if db.read_alias():
+                raise OperationalError('no such table: budget_expense')
+            return 'primary'
+
+        self.forget_writes()
+        with self.assertLogs('budget.db', 'WARNING'):
+            request, result = self.call(db.read_replica(view))
+        self.assertEqual((aliases, result), ([DEFAULT_DB_ALIAS, None], 'primary'))
+        self.assertFalse(caching.read_from_replica(request))
+
+    def test_async_view(self):
+        async def view(request):
+            return db.read_alias()
+
+        self.forget_writes()
+        request, alias = self.call(async_to_sync(db.read_replica(view)))
+        self.assertEqual(alias, DEFAULT_DB_ALIAS)
+        self.assertTrue(caching.read_from_replica(request))
+
+    def test_replica_responses_are_not_cached(self):
+        self.add_expense('25.00')
+        self.forget_writes()
+        response = self.client.get('/api/monthly-reports/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        # Not served from the cache: the view reads the database again
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/monthly-reports/').json(), response.json())
+        self.assertTrue(any('budget_monthlyrollup' in query['sql'] for query in queries))
+
+        # Right after a write the user reads, and caches, from the primary
+        self.add_expense('5.00')
+        self.assertTrue(self.client.get('/api/monthly-reports/').has_header('ETag'))
+
+    def test_replica_connection_is_read_only(self):
+        with tempfile.TemporaryDirectory() as directory:
+            replica = DatabaseWrapper(dict(connection.settings_dict, NAME=os.path.join(directory, 'replica.sqlite3')), 'replica')
+            try:
+                with patch('budget.db.replica_alias', return_value='replica'):
+                    replica.ensure_connection()
+                with self.assertRaisesMessage(OperationalError, 'readonly'):
+                    replica.cursor().execute('CREATE TABLE t (id integer)')
+            finally:
+                replica.close()
+
+
+class SQLiteProfileTests(SimpleTestCase):
+    def connect(self, directory):
+        # A file database of its own: WAL and write locks need one
+        wrapper = DatabaseWrapper(dict(connection.settings_dict, NAME=os.path.join(directory, 'profile.sqlite3')), 'profile')
+        self.addCleanup(wrapper.close)
+        wrapper.force_debug_cursor = True
+        return wrapper
+
+    def test_tuned_connection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                BUDGET_SQLITE_PRAGMAS={'journal_mode': 'WAL', 'busy_timeout': 4321},
+                BUDGET_SQLITE_IMMEDIATE_TRANSACTIONS=True,
+            ):
+                tuned = self.connect(directory)
+                tuned.ensure_connection()
+            self.assertEqual(tuned.connection.execute('PRAGMA journal_mode').fetchone(), ('wal',))
+            self.assertEqual(tuned.connection.execute('PRAGMA busy_timeout').fetchone(), (4321,))
+            self.assertEqual(tuned.connection.execute('PRAGMA query_only').fetchone(), (0,))
+            # What atomic() calls to open a transaction
+            tuned._start_transaction_under_autocommit()
+            self.assertTrue(tuned.connection.in_transaction)
+            self.assertEqual(tuned.queries[-1]['sql'], 'BEGIN IMMEDIATE')
+            tuned.connection.rollback()
+            tuned.close()
+
+    def test_untuned_connection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            plain = self.connect(directory)
+            with override_settings(BUDGET_SQLITE_PRAGMAS={}, BUDGET_SQLITE_IMMEDIATE_TRANSACTIONS=True):
+                plain.ensure_connection()
+            plain.close()
+            # Reconnecting under the untuned settings drops BEGIN IMMEDIATE again
+            with override_settings(BUDGET_SQLITE_PRAGMAS={}, BUDGET_SQLITE_IMMEDIATE_TRANSACTIONS=False):
+                plain.ensure_connection()
+            self.assertEqual(plain.connection.execute('PRAGMA journal_mode').fetchone(), ('delete',))
+            plain._start_transaction_under_autocommit()
+            self.assertEqual(plain.queries[-1]['sql'], 'BEGIN')
+            plain.connection.rollback()
+            plain.close()
+
+
+class ReconcilerTests(BudgetTestCase):
+    def test_incremental_fold_and_delete_below_checkpoint(self):
+        expense = self.add_expense('25.00')
+        result = wallets.reconcile(self.user)
+        self.assertEqual((result['drift'], result['folded']), (0, 2))
+
+        self.request('post', '/api/add-money/', {'amount': '50.00'})
+        result = wallets.reconcile(self.user)
+        self.assertEqual((result['drift'], result['folded']), (0, 1))
+
+        # Both ledger rows are already folded into the checkpoint
+        self.request('delete', f"/api/expenses/{expense['id']}/delete/", status=200)
+        first_add = self.user.transaction_set.filter(type='ADD').order_by('id').first()
+        self.assertLess(first_add.id, result['checkpoint'])
+        self.request('delete', f'/api/transactions/{first_add.id}/delete/', status=200)
+
+        result = wallets.reconcile(self.user)
+        self.assertEqual(result['drift'], 0)
+        self.assertEqual(result['balance'], 50)
+        self.assertEqual(wallets.reconcile(self.user, full=True)['drift'], 0)
+
+    def test_overdraw_then_top_up(self):
+        # Spend more than the 1000 added, then add money again
+        expense = self.add_expense('1050.00')
+        self.assertEqual(self.client.get('/api/dashboard/').json()['wallet_balance'], 0)
+        self.assertEqual(wallets.reconcile(self.user)['drift'], 0)
+        self.request('post', '/api/add-money/', {'amount': '100.00'})
+        self.assertEqual(self.client.get('/api/dashboard/').json()['wallet_balance'], 50)
+
+        result = wallets.reconcile(self.user, repair=True)
+        self.assertEqual((result['drift'], result['repaired'], result['balance']), (0, False, 50))
+        # Reversing the overdrawing expense restores exactly what it took
+        self.request('delete', f"/api/expenses/{expense['id']}/delete/", status=200)
+        self.assertEqual(wallets.get_balance(self.user), 1100)
+        self.assertEqual(wallets.reconcile(self.user)['drift'], 0)
+        self.assertEqual(wallets.reconcile(self.user, full=True)['drift'], 0)
+
+
+class CacheInvalidationTests(BudgetTestCase):
+    """Every write must move the user's data version, so cached responses and ETags refresh"""
+
+    def setUp(self):
+        super().setUp()
+        self.expense = self.add_expense('25.00')
+        self.person = Person.objects.create(user=self.user, name='Asha')
+        PersonalTransaction.objects.create(user=self.user, person=self.person, type='LENT', amount=50, description='loan')
+
+    def assertRefreshed(self, url, write):
+        before = self.client.get(url)
+        self.assertEqual(before.status_code, 200)
+        etag = before['ETag']
+        # Unchanged data: the response is cached and revalidates
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        after = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], etag)
+        self.assertNotEqual(after.json(), before.json())
+
+    def test_wallet_and_expense_writes(self):
+        reports = '/api/monthly-reports/'
+        self.assertRefreshed(reports, lambda: self.request('post', '/api/add-money/', {'amount': '15.00'}, status=200))
+        self.assertRefreshed(reports, lambda: self.add_expense('5.00'))
+        self.assertRefreshed(reports, lambda: self.request(
+            'patch', f"/api/expenses/{self.expense['id']}/", {'amount': '30.00'}, status=200
+        ))
+        self.assertRefreshed('/api/timeseries/?payment_mode=ONLINE', lambda: self.request(
+            'patch', f"/api/expenses/{self.expense['id']}/update-payment-mode/", {'payment_mode': 'ONLINE'}, status=200
+        ))
+        self.assertRefreshed(reports, lambda: self.request(
+            'post', '/api/budgets/', {'amount': '500.00', 'month': self.today.strftime('%Y-%m')}, status=201
+        ))
+        self.assertRefreshed(reports, lambda: self.request('post', '/api/expenses/bulk/', [
+            {'amount': '12.50', 'description': 'bus', 'category': 'Travel'},
+        ], status=201))
+        self.assertRefreshed(reports, lambda: self.request(
+            'post', '/api/expenses/bulk-delete/', {'category': 'Travel'}, status=200
+        ))
+        self.assertRefreshed(reports, lambda: self.request(
+            'delete', f"/api/expenses/{self.expense['id']}/delete/", status=200
+        ))
+        refund = self.user.transaction_set.filter(type='REFUND').values_list('id', flat=True).first()
+        self.assertRefreshed(reports, lambda: self.request('delete', f'/api/transactions/{refund}/delete/', status=200))
+
+    def test_wallet_repair(self):
+        Wallet.objects.filter(user=self.user).update(balance=1)
+        self.assertRefreshed('/api/dashboard/', lambda: wallets.reconcile(self.user, repair=True))
+
+    def test_category_rename(self):
+        self.assertRefreshed('/api/spending-insights/', self.rename_food)
+
+    def rename_food(self):
+        self.food.name = 'Groceries'
+        self.food.save()
+
+    def test_personal_writes(self):
+        dashboard = '/api/personal/dashboard/'
+        self.assertRefreshed(dashboard, lambda: self.request(
+            'post', '/api/people/', {'name': 'Ravi', 'relationship': 'FRIEND'}, status=201
+        ))
+        self.assertRefreshed(dashboard, lambda: self.request('post', '/api/personal-transactions/', {
+            'person': self.person.id, 'type': 'LENT', 'amount': '10.00', 'description': 'more',
+            'date': self.today.isoformat(),
+        }, status=201))
+        self.assertRefreshed(f'/api/personal/person/{self.person.id}/', lambda: self.request(
+            'post', f'/api/personal/person/{self.person.id}/settle/', status=200
+        ))
+        self.assertRefreshed('/api/personal/records/', lambda: self.request('post', '/api/personal/records/', {
+            'type': 'EXPENSE', 'amount': '9.00', 'description': 'book', 'date': self.today.isoformat(),
+        }, status=201))
+
+    def test_bulk_person_total_writes(self):
+        dashboard = '/api/personal/dashboard/'
+        self.assertRefreshed(dashboard, lambda: PersonalTransaction.objects.filter(person=self.person).update(amount=70))
+        self.assertRefreshed(dashboard, lambda: PersonalTransaction.objects.bulk_create([
+            PersonalTransaction(user=self.user, person=self.person, type='LENT', amount=5, description='bulk'),
+        ]))
+        # Drift that is already being served
+        with self.captureOnCommitCallbacks(execute=True):
+            Person.objects.filter(pk=self.person.pk).update(lent=0)
+            caching.bump_version(self.user)
+        self.assertRefreshed(dashboard, lambda: call_command('recompute_person_balances', repair=True, stdout=StringIO()))
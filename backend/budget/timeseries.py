@@ -0,0 +1,93 @@
+from datetime import datetime, time, timedelta
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from .models import Expense, Transaction, PersonalTransaction
+
+GRANULARITIES = ('day', 'week', 'month')
+# Bucket limit per request, roughly ten years of days
+MAX_BUCKETS = 3700
+TRANSACTION_TYPES = [choice for choice, _ in Transaction.TRANSACTION_TYPES]
+PERSONAL_TYPES = [choice for choice, _ in PersonalTransaction.TRANSACTION_TYPES]
+
+
+def bucket_start(day, granularity):
+    """Start of the calendar bucket holding `day`; weeks start on Monday like TruncWeek"""
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def next_bucket(start, granularity):
+    if granularity == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=7 if granularity == 'week' else 1)
+
+
+def bucket_starts(start, end, granularity):
+    """Every bucket start from the one holding `start` to the one holding `end`"""
+    current = bucket_start(start, granularity)
+    buckets = []
+    while current <= end:
+        buckets.append(current)
+        current = next_bucket(current, granularity)
+    return buckets
+
+
+def default_start(end, granularity):
+    """30 days, 12 weeks or 12 months back from `end`"""
+    if granularity == 'month':
+        start = end.replace(day=1)
+        for _ in range(11):
+            start = (start - timedelta(days=1)).replace(day=1)
+        return start
+    if granularity == 'week':
+        return bucket_start(end, 'week') - timedelta(weeks=11)
+    return end - timedelta(days=29)
+
+
+def series(user, start, end, granularity, category=None, payment_mode=None, trans_type=None):
+    """Totals and counts per calendar bucket between two dates (both inclusive), zero-filled.
+
+    `start` is rounded down to the start of its bucket so the first bucket is
+    whole, the same as every later one.
+
+    Reads expenses by default (optionally by category/payment_mode), the
+    wallet ledger for a Transaction type, or personal transactions for a
+    PersonalTransaction type. All buckets come from one GROUP BY query.
+    """
+    if trans_type in TRANSACTION_TYPES:
+        # Transaction.date is a DateTimeField; bucket it in the current timezone
+        queryset = Transaction.objects.filter(
+            user=user,
+            type=trans_type,
+            date__gte=timezone.make_aware(datetime.combine(bucket_start(start, granularity), time.min)),
+            date__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+        )
+    else:
+        model = PersonalTransaction if trans_type in PERSONAL_TYPES else Expense
+        queryset = model.objects.filter(user=user, date__gte=bucket_start(start, granularity), date__lte=end)
+        if trans_type:
+            queryset = queryset.filter(type=trans_type)
+        if category is not None:
+            queryset = queryset.filter(category=category)
+        if payment_mode:
+            queryset = queryset.filter(payment_mode=payment_mode)
+
+    rows = (
+        queryset.annotate(bucket=Trunc('date', granularity, output_field=DateField()))
+        .values('bucket')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    found = {row['bucket']: row for row in rows}
+    return [
+        {
+            'bucket': bucket.isoformat(),
+            'total': float(found[bucket]['total']) if bucket in found else 0.0,
+            'count': found[bucket]['count'] if bucket in found else 0,
+        }
+        for bucket in bucket_starts(start, end, granularity)
+    ]
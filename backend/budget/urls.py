@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 from .authentication import login_view, logout_view, check_auth
 
 router = DefaultRouter()
@@ -12,7 +12,7 @@ router.register(r'personal-transactions', views.PersonalTransactionViewSet, base
 
 urlpatterns = [
     path('api/', include(router.urls)),
-    path('api/dashboard/', views.dashboard_summary, name='dashboard'),
+    path('api/dashboard/', async_views.route('dashboard', views.dashboard_summary, async_views.dashboard_summary), name='dashboard'),
     path('api/add-money/', views.add_money, name='add_money'),
     path('api/transactions/', views.transactions, name='transactions'),
     path('api/monthly-analytics/', views.monthly_analytics, name='monthly_analytics'),
@@ -20,13 +20,17 @@ urlpatterns = [
     path('api/expenses/<int:expense_id>/update-payment-mode/', views.update_payment_mode, name='update_payment_mode'),
     path('api/transactions/<int:transaction_id>/delete/', views.delete_transaction, name='delete_transaction'),
     path('api/spending-insights/', views.spending_insights, name='spending_insights'),
-    path('api/monthly-reports/', views.monthly_reports, name='monthly_reports'),
+    path('api/forecast/', views.forecast, name='forecast'),
+    path('api/monthly-reports/', async_views.route('monthly_reports', views.monthly_reports, async_views.monthly_reports), name='monthly_reports'),
     path('api/download-report/<int:year>/<int:month>/', views.download_monthly_report, name='download_monthly_report'),
+    path('api/export/', views.export_history, name='export_history'),
+    path('api/timeseries/', views.time_series, name='timeseries'),
+    path('api/search/', views.search, name='search'),
     path('api/login/', login_view, name='login'),
     path('api/logout/', logout_view, name='logout'),
     path('api/check-auth/', check_auth, name='check_auth'),
     # Personal Money Management URLs
-    path('api/personal/dashboard/', views.personal_dashboard, name='personal_dashboard'),
+    path('api/personal/dashboard/', async_views.route('personal_dashboard', views.personal_dashboard, async_views.personal_dashboard), name='personal_dashboard'),
     path('api/personal/person/<int:person_id>/', views.person_details, name='person_details'),
     path('api/personal/person/<int:person_id>/settle/', views.settle_person, name='settle_person'),
     path('api/personal/reports/', views.personal_reports, name='personal_reports'),
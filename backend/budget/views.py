@@ -1,20 +1,35 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, renderer_classes
 from rest_framework.permissions import AllowAny
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from django.db.models import Sum
+from rest_framework.utils.urls import replace_query_param
+from django.db.models import Sum, Count, Q
 from django.contrib.auth.hashers import check_password
-from django.db import transaction
+from django.db import OperationalError, transaction
+from django.db.models.functions import Abs, TruncMonth
+from django.utils import timezone
+import csv
+import io
 from datetime import datetime, timedelta
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from calendar import monthrange
-from django.contrib.auth.models import User
-from .models import Category, MonthlyBudget, Expense, Wallet, Transaction, Person, PersonalTransaction, PersonalRecord
+from .models import Category, MonthlyBudget, Expense, Transaction, Person, PersonalTransaction, PersonalRecord, MonthlyRollup, person_balance
 from .serializers import (CategorySerializer, MonthlyBudgetSerializer, ExpenseSerializer, 
                          WalletSerializer, TransactionSerializer, AddMoneySerializer, 
-                         PersonSerializer, PersonalTransactionSerializer, PersonalRecordSerializer)
+                         PersonSerializer, PersonalTransactionSerializer, PersonalRecordSerializer,
+                         BulkExpenseRowSerializer)
+from . import caching, forecasting, fulltext, rollups, timeseries, wallets
+from .pagination import KeysetPagination
+from .exports import EXPORT_FORMATS, EXPORT_RENDERER_CLASSES, streaming_export
+from .insights import spending_anomalies
+from .db import read_replica
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+BULK_IMPORT_MAX_ROWS = 10000
 
 @method_decorator(csrf_exempt, name='dispatch')
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -28,14 +43,13 @@ class MonthlyBudgetViewSet(viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     
     def get_queryset(self):
-        # Get muskan user for demo
-        admin_user = User.objects.filter(username='muskan').first()
+        admin_user = self.request.budget_user
         if admin_user:
             return MonthlyBudget.objects.filter(user=admin_user)
         return MonthlyBudget.objects.none()
     
     def create(self, request, *args, **kwargs):
-        admin_user = User.objects.filter(username='muskan').first()
+        admin_user = self.request.budget_user
         if not admin_user:
             return Response({'error': 'User not found'}, status=404)
         
@@ -66,25 +80,89 @@ class MonthlyBudgetViewSet(viewsets.ModelViewSet):
 class ExpenseViewSet(viewsets.ModelViewSet):
     serializer_class = ExpenseSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    
+    # Model fields each serializer field reads, for ?fields=
+    FIELD_SOURCES = {
+        'id': ['id'],
+        'amount': ['amount'],
+        'description': ['description'],
+        'category': ['category'],
+        'category_name': ['category__name'],
+        'category_icon': ['category__icon'],
+        'category_color': ['category__color'],
+        'date': ['date'],
+        'payment_mode': ['payment_mode'],
+        'created_at': ['created_at'],
+    }
     
     def get_queryset(self):
-        # Get muskan user for demo
-        admin_user = User.objects.filter(username='muskan').first()
-        if admin_user:
-            return Expense.objects.filter(user=admin_user)
-        return Expense.objects.none()
+        admin_user = self.request.budget_user
+        if not admin_user:
+            return Expense.objects.none()
+        expenses = Expense.objects.filter(user=admin_user)
+        fields = self.requested_fields()
+        if fields is None:
+            return expenses.select_related('category')
+        columns = {'date', 'created_at'}  # keyset pagination reads the ordering columns
+        for name in fields:
+            columns.update(self.FIELD_SOURCES[name])
+        if any(column.startswith('category__') for column in columns):
+            expenses = expenses.select_related('category')
+        return expenses.only(*columns)
+    
+    def requested_fields(self):
+        """Serializer fields named by ?fields=a,b on reads, None for all of them"""
+        value = self.request.query_params.get('fields') if self.request.method == 'GET' else None
+        if not value:
+            return None
+        fields = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in self.FIELD_SOURCES]
+        if unknown:
+            raise ValidationError({'error': f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(self.FIELD_SOURCES)}"})
+        return fields
+    
+    def get_serializer(self, *args, **kwargs):
+        fields = self.requested_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+    
+    def filter_queryset(self, queryset):
+        """List filters: date_from, date_to, category (id or name), payment_mode, min_amount, max_amount"""
+        queryset = super().filter_queryset(queryset)
+        if self.action != 'list':
+            return queryset
+        params = self.request.query_params
+        try:
+            if params.get('date_from'):
+                queryset = queryset.filter(date__gte=datetime.strptime(params['date_from'], '%Y-%m-%d').date())
+            if params.get('date_to'):
+                queryset = queryset.filter(date__lte=datetime.strptime(params['date_to'], '%Y-%m-%d').date())
+        except ValueError:
+            raise ValidationError({'error': 'date_from and date_to must be dates in YYYY-MM-DD format'})
+        try:
+            if params.get('min_amount'):
+                queryset = queryset.filter(amount__gte=Decimal(params['min_amount']))
+            if params.get('max_amount'):
+                queryset = queryset.filter(amount__lte=Decimal(params['max_amount']))
+        except InvalidOperation:
+            raise ValidationError({'error': 'min_amount and max_amount must be numbers'})
+        if params.get('category'):
+            category = params['category']
+            queryset = queryset.filter(category_id=category) if category.isdigit() else queryset.filter(category__name__iexact=category)
+        if params.get('payment_mode'):
+            queryset = queryset.filter(payment_mode=params['payment_mode'])
+        return queryset
     
     def perform_create(self, serializer):
-        # Get muskan user for demo
-        admin_user = User.objects.filter(username='muskan').first()
+        admin_user = self.request.budget_user
         if admin_user:
             with transaction.atomic():
                 expense = serializer.save(user=admin_user)
                 
                 # Update wallet balance
-                wallet, created = Wallet.objects.get_or_create(user=admin_user)
-                wallet.balance = max(0, wallet.balance - expense.amount)
-                wallet.save()
+                wallets.debit(admin_user, expense.amount)
                 
                 # Create transaction record
                 Transaction.objects.create(
@@ -93,64 +171,276 @@ class ExpenseViewSet(viewsets.ModelViewSet):
                     amount=expense.amount,
                     description=f"Expense: {expense.description}"
                 )
-
-@api_view(['GET'])
-@permission_classes([AllowAny])
-@csrf_exempt
-def dashboard_summary(request):
-    current_month = datetime.now().replace(day=1).date()
-    admin_user = User.objects.filter(username='muskan').first()
-    if not admin_user:
-        return Response({'error': 'Muskan user not found'}, status=404)
     
-    # Calculate wallet balance from all transactions including refunds
-    all_transactions = Transaction.objects.filter(user=admin_user)
-    income = all_transactions.filter(type='ADD').aggregate(Sum('amount'))['amount__sum'] or 0
-    refunds = all_transactions.filter(type='REFUND').aggregate(Sum('amount'))['amount__sum'] or 0
-    expenses = all_transactions.filter(type='EXPENSE').aggregate(Sum('amount'))['amount__sum'] or 0
-    calculated_balance = float(income) + float(refunds) - float(expenses)
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """Import many expenses from a JSON array or an uploaded CSV (`file`) in one transaction"""
+        admin_user = self.request.budget_user
+        if not admin_user:
+            return Response({'error': 'User not found'}, status=404)
+        
+        upload = request.FILES.get('file')
+        if upload:
+            reader = csv.DictReader(io.TextIOWrapper(upload.file, encoding='utf-8-sig'))
+            # Blank optional cells fall back to their defaults
+            rows = [
+                {(key or '').strip().lower(): value.strip() for key, value in row.items() if value and value.strip()}
+                for row in reader
+            ]
+        else:
+            rows = request.data.get('expenses') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({'error': 'Send a non-empty JSON array of expenses or a CSV file'}, status=400)
+        if len(rows) > BULK_IMPORT_MAX_ROWS:
+            return Response({'error': f'At most {BULK_IMPORT_MAX_ROWS} rows per import'}, status=400)
+        
+        # Resolve category names and ids with a single lookup
+        categories = {}
+        for category in Category.objects.all():
+            categories[str(category.id)] = category
+            categories[category.name.lower()] = category
+        
+        today = datetime.now().date()
+        expenses = []
+        errors = []
+        for index, row in enumerate(rows, start=1):
+            row_serializer = BulkExpenseRowSerializer(data=row)
+            if not row_serializer.is_valid():
+                errors.append({'row': index, 'errors': row_serializer.errors})
+                continue
+            data = row_serializer.validated_data
+            category = categories.get(data['category'].strip().lower())
+            if not category:
+                errors.append({'row': index, 'errors': {'category': [f"Unknown category '{data['category']}'"]}})
+                continue
+            expenses.append(Expense(
+                user=admin_user,
+                amount=data['amount'],
+                description=data['description'],
+                category=category,
+                date=data.get('date', today),
+                payment_mode=data['payment_mode'],
+            ))
+        
+        if not expenses:
+            return Response({'created': 0, 'total': 0, 'errors': errors}, status=400)
+        
+        total = sum(expense.amount for expense in expenses)
+        with transaction.atomic():
+            # Settle the whole import against the wallet at once, before the
+            # ledger rows are written (see wallets.reconcile)
+            wallets.debit(admin_user, total)
+            Expense.objects.bulk_create(expenses, batch_size=500)
+            transactions = Transaction.objects.bulk_create([
+                Transaction(
+                    user=admin_user,
+                    type='EXPENSE',
+                    amount=expense.amount,
+                    description=f"Expense: {expense.description}"
+                )
+                for expense in expenses
+            ], batch_size=500)
+            # bulk_create skips the signals that keep the monthly rollups current
+            rollups.apply_expenses(expenses)
+            rollups.apply_transactions(transactions)
+            caching.bump_version(admin_user)
+            new_balance = wallets.get_balance(admin_user)
+        
+        return Response({
+            'created': len(expenses),
+            'total': float(total),
+            'new_balance': float(new_balance),
+            'errors': errors
+        }, status=201)
     
-    # Update wallet with calculated balance
-    wallet, created = Wallet.objects.get_or_create(user=admin_user)
-    wallet.balance = max(0, calculated_balance)
-    wallet.save()
+    @action(detail=False, methods=['post'], url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """Delete and refund many expenses, chosen by `ids` or by date_from/date_to/category/payment_mode"""
+        admin_user = self.request.budget_user
+        if not admin_user:
+            return Response({'error': 'User not found'}, status=404)
+        
+        data = request.data
+        if not isinstance(data, dict):
+            return Response({'error': 'Send a JSON object with ids or filters'}, status=400)
+        expenses = Expense.objects.filter(user=admin_user)
+        criteria = False
+        try:
+            if data.get('ids') is not None:
+                ids = data['ids']
+                if not isinstance(ids, list):
+                    raise ValueError('ids must be a list')
+                expenses = expenses.filter(id__in=[int(expense_id) for expense_id in ids])
+                criteria = True
+            if data.get('date_from'):
+                expenses = expenses.filter(date__gte=datetime.strptime(data['date_from'], '%Y-%m-%d').date())
+                criteria = True
+            if data.get('date_to'):
+                expenses = expenses.filter(date__lte=datetime.strptime(data['date_to'], '%Y-%m-%d').date())
+                criteria = True
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=400)
+        if data.get('category'):
+            category = str(data['category'])
+            expenses = expenses.filter(category_id=category) if category.isdigit() else expenses.filter(category__name__iexact=category)
+            criteria = True
+        if data.get('payment_mode'):
+            expenses = expenses.filter(payment_mode=data['payment_mode'])
+            criteria = True
+        if not criteria:
+            return Response({'error': 'Provide ids or at least one of date_from, date_to, category, payment_mode'}, status=400)
+        
+        with transaction.atomic():
+            expenses = expenses.select_for_update()
+            totals = expenses.aggregate(total=Sum('amount', default=0), count=Count('id'))
+            if not totals['count']:
+                return Response({'deleted': 0, 'refunded': 0, 'message': 'No matching expenses'})
+            
+            # Refund the whole batch to the wallet at once, before the ledger
+            # rows are written (see wallets.reconcile)
+            wallets.credit(admin_user, totals['total'])
+            
+            rows = [
+                Expense(**row) for row in expenses.values(
+                    'id', 'user_id', 'amount', 'description', 'date', 'category_id', 'payment_mode'
+                ).order_by()
+            ]
+            
+            # Create refund transactions (REFUND type to distinguish from income)
+            refunds = Transaction.objects.bulk_create([
+                Transaction(
+                    user=admin_user,
+                    type='REFUND',
+                    amount=expense.amount,
+                    description=f"Refund: {expense.description}"
+                )
+                for expense in rows
+            ], batch_size=500)
+            
+            with rollups.suspended():
+                Expense.objects.filter(id__in=[expense.id for expense in rows]).delete()
+            rollups.apply_expenses(rows, sign=-1)
+            rollups.apply_transactions(refunds)
+            new_balance = wallets.get_balance(admin_user)
+        
+        return Response({
+            'deleted': totals['count'],
+            'refunded': float(totals['total']),
+            'new_balance': float(new_balance),
+            'message': f"{totals['count']} expenses deleted and refunded"
+        })
+
+def monthly_rollup_totals(user, months):
+    """Sum the MonthlyRollup buckets of each requested month in one query"""
+    rows = MonthlyRollup.objects.filter(user=user, month__in=months).values('month').annotate(
+        spent=Sum('spent'),
+        expense_count=Sum('expense_count'),
+        income=Sum('income'),
+        income_count=Sum('income_count'),
+        refunds=Sum('refunds'),
+        refund_count=Sum('refund_count'),
+        debits=Sum('debits'),
+        debit_count=Sum('debit_count'),
+    ).order_by()
+    return {row.pop('month'): row for row in rows}
+
+def next_month(month_start):
+    return (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def month_datetime_range(month_start):
+    """Aware [start, end) datetimes of a month, for sargable DateTimeField filters"""
+    start = timezone.make_aware(datetime.combine(month_start, datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(next_month(month_start), datetime.min.time()))
+    return start, end
+
+def monthly_budget_amounts(user, months):
+    return {
+        budget.month: float(budget.amount)
+        for budget in MonthlyBudget.objects.filter(user=user, month__in=months)
+    }
+
+def dashboard_period(today, month_param=None):
+    """Dates the dashboard reports on; ValueError for a malformed month"""
+    current_month = today.replace(day=1)
+    if month_param:
+        current_month = datetime.strptime(month_param + '-01', '%Y-%m-%d').date()
+    days_in_month = monthrange(current_month.year, current_month.month)[1]
+    month_end = current_month.replace(day=days_in_month)
     
-    # Get current month budget
-    try:
-        budget = MonthlyBudget.objects.get(user=admin_user, month=current_month)
-        budget_amount = float(budget.amount)
-    except MonthlyBudget.DoesNotExist:
-        budget_amount = 0
+    # Days of the month elapsed so far (the whole month for past months)
+    if month_end < today:
+        current_day = days_in_month
+    elif current_month > today:
+        current_day = 0
+    else:
+        current_day = today.day
     
-    # Get current month expenses
-    expenses = Expense.objects.filter(
-        user=admin_user,
-        date__year=current_month.year,
-        date__month=current_month.month
-    )
+    # Last 7 days, ending today or at the end of a past month
+    week_end = min(today, month_end)
+    return {
+        'today': today,
+        'month': current_month,
+        'month_end': month_end,
+        'days_in_month': days_in_month,
+        'current_day': current_day,
+        'week_start': week_end - timedelta(days=7),
+        'week_end': week_end,
+    }
+
+def dashboard_queries(user, period):
+    """The dashboard's independent queries as callables, so they can also run concurrently"""
+    in_month = Q(date__gte=period['month'], date__lte=period['month_end'])
+    in_week = Q(date__gte=period['week_start'], date__lte=period['week_end'])
+    queries = {
+        # Kept exact by the atomic wallet updates; wallets.reconcile() checks it against the ledger
+        'wallet_balance': lambda: wallets.get_balance(user),
+        'budget': lambda: MonthlyBudget.objects.filter(
+            user=user, month=period['month']
+        ).values_list('amount', flat=True).first(),
+        # Month and week expense figures per category in a single pass
+        'categories': lambda: list(
+            Expense.objects.filter(in_month | in_week, user=user)
+            .values('category__name', 'category__icon', 'category__color')
+            .annotate(
+                total=Sum('amount', filter=in_month, default=0),
+                count=Count('id', filter=in_month),
+                week_total=Sum('amount', filter=in_week, default=0),
+            )
+            .order_by('-total')
+        ),
+    }
+    if period['month'] == period['today'].replace(day=1):
+        # The cached per-category model; past months are already complete
+        queries['forecast'] = lambda: forecasting.forecast(user, period['today'])['projected']
+    return queries
+
+def build_dashboard(period, results):
+    budget_amount = float(results['budget'] or 0)
+    categories = results['categories']
+    days_in_month = period['days_in_month']
+    current_day = period['current_day']
     
-    total_spent = expenses.aggregate(Sum('amount'))['amount__sum'] or 0
+    total_spent = sum(cat['total'] for cat in categories)
+    expenses_count = sum(cat['count'] for cat in categories)
+    week_spent = sum(cat['week_total'] for cat in categories)
     remaining_budget = max(0, budget_amount - float(total_spent)) if budget_amount > 0 else 0
     
     # Calculate daily average and projections
-    days_in_month = (datetime.now().replace(month=datetime.now().month % 12 + 1, day=1) - timedelta(days=1)).day
-    current_day = datetime.now().day
     daily_avg = float(total_spent) / current_day if current_day > 0 else 0
-    projected_monthly = daily_avg * days_in_month
-    
-    # Get last 7 days expenses
-    last_week = datetime.now().date() - timedelta(days=7)
-    week_expenses = Expense.objects.filter(user=admin_user, date__gte=last_week)
-    week_spent = week_expenses.aggregate(Sum('amount'))['amount__sum'] or 0
+    projected_monthly = results.get('forecast', daily_avg * days_in_month)
     
     # Category breakdown with percentages
-    category_breakdown = expenses.values('category__name', 'category__icon', 'category__color').annotate(
-        total=Sum('amount')
-    ).order_by('-total')[:5]
-    
-    # Add percentage to categories
-    for cat in category_breakdown:
-        cat['percentage'] = (float(cat['total']) / float(total_spent) * 100) if total_spent > 0 else 0
+    category_breakdown = []
+    for cat in categories[:5]:
+        if cat['total'] <= 0:
+            break
+        category_breakdown.append({
+            'category__name': cat['category__name'],
+            'category__icon': cat['category__icon'],
+            'category__color': cat['category__color'],
+            'total': cat['total'],
+            'percentage': (float(cat['total']) / float(total_spent) * 100) if total_spent > 0 else 0
+        })
     
     # Budget health status
     if budget_amount > 0:
@@ -164,19 +454,37 @@ def dashboard_summary(request):
     else:
         budget_status = 'no_budget'
     
-    return Response({
-        'wallet_balance': float(wallet.balance),
+    return {
+        'month': period['month'].strftime('%Y-%m'),
+        'wallet_balance': float(results['wallet_balance']),
         'budget': budget_amount,
         'spent': float(total_spent),
         'remaining_budget': remaining_budget,
-        'expenses_count': expenses.count(),
+        'expenses_count': expenses_count,
         'week_spent': float(week_spent),
         'daily_average': daily_avg,
         'projected_monthly': projected_monthly,
         'budget_status': budget_status,
         'spent_percentage': (float(total_spent) / budget_amount * 100) if budget_amount > 0 else 0,
-        'category_breakdown': list(category_breakdown)
-    })
+        'category_breakdown': category_breakdown
+    }
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@csrf_exempt
+def dashboard_summary(request):
+    admin_user = request.budget_user
+    if not admin_user:
+        return Response({'error': 'Muskan user not found'}, status=404)
+    
+    # Optional ?month=YYYY-MM, defaults to the current month
+    try:
+        period = dashboard_period(datetime.now().date(), request.query_params.get('month'))
+    except ValueError:
+        return Response({'error': 'Invalid month, expected YYYY-MM'}, status=400)
+    
+    results = {name: query() for name, query in dashboard_queries(admin_user, period).items()}
+    return Response(build_dashboard(period, results))
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -189,16 +497,13 @@ def add_money(request):
         if amount <= 0:
             return Response({'error': 'Amount must be positive'}, status=400)
         
-        # Get muskan user for demo
-        admin_user = User.objects.filter(username='muskan').first()
+        admin_user = request.budget_user
         if not admin_user:
             return Response({'error': 'Muskan user not found'}, status=404)
         
         with transaction.atomic():
             # Update wallet
-            wallet, created = Wallet.objects.get_or_create(user=admin_user)
-            wallet.balance += amount
-            wallet.save()
+            wallets.credit(admin_user, amount)
             
             # Create transaction record
             Transaction.objects.create(
@@ -207,10 +512,11 @@ def add_money(request):
                 amount=amount,
                 description=description
             )
+            new_balance = wallets.get_balance(admin_user)
         
         return Response({
             'success': True, 
-            'new_balance': float(wallet.balance),
+            'new_balance': float(new_balance),
             'message': 'Funds added successfully'
         })
     except Exception as e:
@@ -220,10 +526,15 @@ def add_money(request):
 @permission_classes([AllowAny])
 @csrf_exempt
 def transactions(request):
-    admin_user = User.objects.filter(username='muskan').first()
+    admin_user = request.budget_user
     if admin_user:
-        user_transactions = Transaction.objects.filter(user=admin_user).order_by('-date')[:20]
-        serializer = TransactionSerializer(user_transactions, many=True)
+        user_transactions = Transaction.objects.filter(user=admin_user)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(user_transactions, request)
+        if page is not None:
+            return paginator.get_paginated_response(TransactionSerializer(page, many=True).data)
+        # Unpaginated clients get the 20 most recent transactions
+        serializer = TransactionSerializer(user_transactions.order_by('-date')[:20], many=True)
         return Response(serializer.data)
     return Response([])
 
@@ -247,13 +558,17 @@ def verify_personal_password(request):
 @csrf_exempt
 def personal_records(request):
     """Handle personal diary records"""
-    admin_user = User.objects.filter(username='muskan').first()
+    admin_user = request.budget_user
     if not admin_user:
         return Response({'error': 'User not found'}, status=404)
     
     if request.method == 'GET':
-        records = PersonalRecord.objects.filter(user=admin_user).order_by('-date')
-        serializer = PersonalRecordSerializer(records, many=True)
+        records = PersonalRecord.objects.filter(user=admin_user)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(records, request)
+        if page is not None:
+            return paginator.get_paginated_response(PersonalRecordSerializer(page, many=True).data)
+        serializer = PersonalRecordSerializer(records.order_by('-date'), many=True)
         return Response(serializer.data)
     
     elif request.method == 'POST':
@@ -266,39 +581,32 @@ def personal_records(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 @csrf_exempt
+@caching.cached_response('monthly_analytics')
+@read_replica
 def monthly_analytics(request):
     """Get detailed monthly spending analytics"""
-    admin_user = User.objects.filter(username='muskan').first()
+    admin_user = request.budget_user
     if not admin_user:
         return Response({'error': 'User not found'}, status=404)
     
     # Get last 6 months data
+    target_months = report_months(6)
+    totals = monthly_rollup_totals(admin_user, target_months)
+    budgets = monthly_budget_amounts(admin_user, target_months)
+    
     months_data = []
-    for i in range(6):
-        target_date = datetime.now().replace(day=1) - timedelta(days=i*30)
-        target_month = target_date.replace(day=1).date()
-        
-        expenses = Expense.objects.filter(
-            user=admin_user,
-            date__year=target_month.year,
-            date__month=target_month.month
-        )
-        
-        try:
-            budget = MonthlyBudget.objects.get(user=admin_user, month=target_month)
-            budget_amount = float(budget.amount)
-        except MonthlyBudget.DoesNotExist:
-            budget_amount = 0
-        
-        total_spent = expenses.aggregate(Sum('amount'))['amount__sum'] or 0
+    for target_month in target_months:
+        month_totals = totals.get(target_month, {})
+        budget_amount = budgets.get(target_month, 0)
+        total_spent = month_totals.get('spent') or 0
         
         months_data.append({
             'month': target_month.strftime('%Y-%m'),
-            'month_name': target_date.strftime('%B %Y'),
+            'month_name': target_month.strftime('%B %Y'),
             'budget': budget_amount,
             'spent': float(total_spent),
             'remaining': max(0, budget_amount - float(total_spent)),
-            'expenses_count': expenses.count()
+            'expenses_count': month_totals.get('expense_count') or 0
         })
     
     return Response(months_data)
@@ -308,7 +616,7 @@ def monthly_analytics(request):
 @csrf_exempt
 def update_payment_mode(request, expense_id):
     """Update payment mode (CASH/ONLINE) for an expense"""
-    admin_user = User.objects.filter(username='muskan').first()
+    admin_user = request.budget_user
     if not admin_user:
         return Response({'error': 'User not found'}, status=404)
     try:
@@ -327,18 +635,17 @@ def update_payment_mode(request, expense_id):
 @csrf_exempt
 def delete_expense(request, expense_id):
     """Delete an expense and update wallet balance"""
-    admin_user = User.objects.filter(username='muskan').first()
+    admin_user = request.budget_user
     if not admin_user:
         return Response({'error': 'User not found'}, status=404)
     
     try:
-        expense = Expense.objects.get(id=expense_id, user=admin_user)
-        
         with transaction.atomic():
+            # Lock the row so two concurrent deletes cannot refund it twice
+            expense = Expense.objects.select_for_update().get(id=expense_id, user=admin_user)
+            
             # Refund to wallet
-            wallet, created = Wallet.objects.get_or_create(user=admin_user)
-            wallet.balance += expense.amount
-            wallet.save()
+            wallets.credit(admin_user, expense.amount)
             
             # Create refund transaction (REFUND type to distinguish from income)
             Transaction.objects.create(
@@ -358,89 +665,82 @@ def delete_expense(request, expense_id):
 @permission_classes([AllowAny])
 @csrf_exempt
 def delete_transaction(request, transaction_id):
-    admin_user = User.objects.filter(username='muskan').first()
+    admin_user = request.budget_user
     if not admin_user:
         return Response({'error': 'User not found'}, status=404)
     
     try:
-        trans = Transaction.objects.get(id=transaction_id, user=admin_user)
-        
         with transaction.atomic():
-            wallet, created = Wallet.objects.get_or_create(user=admin_user)
-            
-            # Reverse the transaction effect on wallet
-            if trans.type == 'ADD':
-                wallet.balance = max(0, wallet.balance - trans.amount)
-            else:  # EXPENSE
-                wallet.balance += trans.amount
-            
-            wallet.save()
+            trans = Transaction.objects.select_for_update().get(id=transaction_id, user=admin_user)
+            # The post_delete signal reverses the transaction effect on wallet
             trans.delete()
         
         return Response({'success': True, 'message': 'Transaction deleted successfully'})
     except Transaction.DoesNotExist:
         return Response({'error': 'Transaction not found'}, status=404)
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-@csrf_exempt
-def monthly_reports(request):
-    """Get monthly transaction reports"""
-    admin_user = User.objects.filter(username='muskan').first()
-    if not admin_user:
-        return Response({'error': 'User not found'}, status=404)
-    
-    # Get last 12 months data
+def report_months(count):
+    """First days of the current and the previous `count - 1` calendar months, newest first"""
+    months = [datetime.now().date().replace(day=1)]
+    while len(months) < count:
+        months.append((months[-1] - timedelta(days=1)).replace(day=1))
+    return months
+
+def monthly_reports_queries(user, months):
+    return {
+        'totals': lambda: monthly_rollup_totals(user, months),
+        'budgets': lambda: monthly_budget_amounts(user, months),
+    }
+
+def build_monthly_reports(months, results):
+    totals, budgets = results['totals'], results['budgets']
     reports = []
-    for i in range(12):
-        target_date = datetime.now().replace(day=1) - timedelta(days=i*30)
-        month_start = target_date.replace(day=1).date()
-        
-        # Get month transactions
-        month_transactions = Transaction.objects.filter(
-            user=admin_user,
-            date__year=month_start.year,
-            date__month=month_start.month
-        )
-        
-        # Calculate totals (exclude refunds from income)
-        income = month_transactions.filter(type='ADD').aggregate(Sum('amount'))['amount__sum'] or 0
+    for month_start in months:
+        month_totals = totals.get(month_start, {})
         
-        # Get actual expenses (not deleted ones) from Expense model
-        month_expenses = Expense.objects.filter(
-            user=admin_user,
-            date__year=month_start.year,
-            date__month=month_start.month
-        )
-        expenses = month_expenses.aggregate(Sum('amount'))['amount__sum'] or 0
-        
-        # Get budget
-        try:
-            budget = MonthlyBudget.objects.get(user=admin_user, month=month_start)
-            budget_amount = float(budget.amount)
-        except MonthlyBudget.DoesNotExist:
-            budget_amount = 0
+        # Income excludes refunds; expenses are actual (not deleted) Expense rows
+        income = month_totals.get('income') or 0
+        expenses = month_totals.get('spent') or 0
+        income_count = month_totals.get('income_count') or 0
+        expense_count = month_totals.get('debit_count') or 0
         
         reports.append({
             'month': month_start.strftime('%Y-%m'),
-            'month_name': target_date.strftime('%B %Y'),
+            'month_name': month_start.strftime('%B %Y'),
             'income': float(income),
             'expenses': float(expenses),
             'net_savings': float(income) - float(expenses),
-            'budget': budget_amount,
-            'transactions_count': month_transactions.count(),
-            'income_transactions': month_transactions.filter(type='ADD').count(),
-            'expense_transactions': month_transactions.filter(type='EXPENSE').count()
+            'budget': budgets.get(month_start, 0),
+            'transactions_count': income_count + expense_count + (month_totals.get('refund_count') or 0),
+            'income_transactions': income_count,
+            'expense_transactions': expense_count
         })
+    return reports
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@csrf_exempt
+@caching.cached_response('monthly_reports')
+@read_replica
+def monthly_reports(request):
+    """Get monthly transaction reports"""
+    admin_user = request.budget_user
+    if not admin_user:
+        return Response({'error': 'User not found'}, status=404)
     
-    return Response(reports)
+    # Get last 12 months data
+    months = report_months(12)
+    results = {name: query() for name, query in monthly_reports_queries(admin_user, months).items()}
+    return Response(build_monthly_reports(months, results))
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@renderer_classes(EXPORT_RENDERER_CLASSES)
 @csrf_exempt
+@read_replica
 def download_monthly_report(request, year, month):
-    """Download detailed monthly report with all transactions"""
-    admin_user = User.objects.filter(username='muskan').first()
+    """Download detailed monthly report with all transactions (streamed with ?format=csv|ndjson)"""
+    admin_user = request.budget_user
     if not admin_user:
         return Response({'error': 'User not found'}, status=404)
     
@@ -454,11 +754,19 @@ def download_monthly_report(request, year, month):
         days_in_month = monthrange(year, month)[1]
         month_end = datetime(year, month, days_in_month).date()
         
+        export_format = request.query_params.get('format')
+        if export_format in EXPORT_FORMATS:
+            return streaming_export(
+                admin_user, export_format, f"report-{month_start.strftime('%Y-%m')}",
+                start=month_start, end=month_end
+            )
+        
         # Get all transactions for the month
+        range_start, range_end = month_datetime_range(month_start)
         transactions = Transaction.objects.filter(
             user=admin_user,
-            date__gte=month_start,
-            date__lte=month_end
+            date__gte=range_start,
+            date__lt=range_end
         ).order_by('date')
         
         # Get expenses with category details
@@ -519,45 +827,68 @@ def download_monthly_report(request, year, month):
         
     except ValueError:
         return Response({'error': 'Invalid year or month'}, status=400)
+    except OperationalError:
+        # Let @read_replica retry on the primary
+        raise
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@renderer_classes(EXPORT_RENDERER_CLASSES)
 @csrf_exempt
+def export_history(request):
+    """Stream transactions and expenses as CSV or NDJSON, optionally limited to ?start=&end= (YYYY-MM-DD)"""
+    admin_user = request.budget_user
+    if not admin_user:
+        return Response({'error': 'User not found'}, status=404)
+    
+    # DRF's content negotiation already answers any other ?format= with a 404
+    export_format = request.query_params.get('format', 'csv')
+    
+    try:
+        start = request.query_params.get('start')
+        end = request.query_params.get('end')
+        start = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+        end = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+    except ValueError:
+        return Response({'error': 'Invalid date, expected YYYY-MM-DD'}, status=400)
+    
+    filename = f"budget-{start or 'start'}-to-{end or 'now'}"
+    return streaming_export(admin_user, export_format, filename, start=start, end=end)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@csrf_exempt
+@caching.cached_response('spending_insights')
+@read_replica
 def spending_insights(request):
     """Get AI-like spending insights and recommendations"""
-    admin_user = User.objects.filter(username='muskan').first()
+    admin_user = request.budget_user
     if not admin_user:
         return Response({'error': 'User not found'}, status=404)
     
     current_month = datetime.now().replace(day=1).date()
     last_month = (current_month - timedelta(days=1)).replace(day=1)
     
+    totals = monthly_rollup_totals(admin_user, [current_month, last_month])
+    
     # Current month data
-    current_expenses = Expense.objects.filter(
-        user=admin_user,
-        date__year=current_month.year,
-        date__month=current_month.month
-    )
-    current_spent = current_expenses.aggregate(Sum('amount'))['amount__sum'] or 0
+    current_spent = totals.get(current_month, {}).get('spent') or 0
     
     # Last month data
-    last_expenses = Expense.objects.filter(
-        user=admin_user,
-        date__year=last_month.year,
-        date__month=last_month.month
-    )
-    last_spent = last_expenses.aggregate(Sum('amount'))['amount__sum'] or 0
+    last_spent = totals.get(last_month, {}).get('spent') or 0
     
     # Calculate trends
     spending_trend = 'increased' if current_spent > last_spent else 'decreased'
     trend_percentage = abs((float(current_spent) - float(last_spent)) / float(last_spent) * 100) if last_spent > 0 else 0
     
     # Top spending category
-    top_category = current_expenses.values('category__name').annotate(
-        total=Sum('amount')
-    ).order_by('-total').first()
+    top_category = MonthlyRollup.objects.filter(
+        user=admin_user, month=current_month, category__isnull=False
+    ).values('category__name').annotate(
+        total=Sum('spent')
+    ).filter(total__gt=0).order_by('-total').first()
     
     # Generate insights
     insights = []
@@ -572,34 +903,53 @@ def spending_insights(request):
     # Budget recommendations
     try:
         budget = MonthlyBudget.objects.get(user=admin_user, month=current_month)
-        if current_spent > budget.amount * 0.8:
+        if current_spent > budget.amount * Decimal('0.8'):
             insights.append("You're close to your budget limit. Consider reducing discretionary spending.")
     except MonthlyBudget.DoesNotExist:
         insights.append("Set a monthly budget to better track your spending goals.")
     
+    # Unusual days per category, most unusual first
+    detected = spending_anomalies(admin_user)
+    insights.extend(anomaly['message'] for anomaly in detected['anomalies'][:3])
+    
     return Response({
         'spending_trend': spending_trend,
         'trend_percentage': trend_percentage,
         'top_category': top_category['category__name'] if top_category else None,
         'insights': insights,
         'current_month_spent': float(current_spent),
-        'last_month_spent': float(last_spent)
+        'last_month_spent': float(last_spent),
+        'anomalies': detected['anomalies'],
+        'week_over_week': detected['week_over_week']
     })
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@csrf_exempt
+def forecast(request):
+    """Projected month-end spend per category and the day the budget would run out"""
+    admin_user = request.budget_user
+    if not admin_user:
+        return Response({'error': 'User not found'}, status=404)
+    
+    # Fitted once per data version and day, see forecasting.forecast
+    return Response(forecasting.forecast(admin_user))
+
 # Personal Money Management Views
 @method_decorator(csrf_exempt, name='dispatch')
 class PersonViewSet(viewsets.ModelViewSet):
     serializer_class = PersonSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        admin_user = User.objects.filter(username='muskan').first()
+        admin_user = self.request.budget_user
         if admin_user:
             return Person.objects.filter(user=admin_user)
         return Person.objects.none()
     
     def perform_create(self, serializer):
-        admin_user = User.objects.filter(username='muskan').first()
+        admin_user = self.request.budget_user
         if admin_user:
             serializer.save(user=admin_user)
 
@@ -607,59 +957,66 @@ class PersonViewSet(viewsets.ModelViewSet):
 class PersonalTransactionViewSet(viewsets.ModelViewSet):
     serializer_class = PersonalTransactionSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        admin_user = User.objects.filter(username='muskan').first()
+        admin_user = self.request.budget_user
         if admin_user:
-            return PersonalTransaction.objects.filter(user=admin_user)
+            return PersonalTransaction.objects.filter(user=admin_user).select_related('person')
         return PersonalTransaction.objects.none()
     
     def perform_create(self, serializer):
-        admin_user = User.objects.filter(username='muskan').first()
+        admin_user = self.request.budget_user
         if admin_user:
             serializer.save(user=admin_user)
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-@csrf_exempt
-def personal_dashboard(request):
-    """Get personal money management dashboard"""
-    admin_user = User.objects.filter(username='muskan').first()
-    if not admin_user:
-        return Response({'error': 'User not found'}, status=404)
-    
-    # Get all personal transactions
-    transactions = PersonalTransaction.objects.filter(user=admin_user)
-    
-    # Calculate totals
-    total_lent = transactions.filter(type='LENT').aggregate(Sum('amount'))['amount__sum'] or 0
-    total_received = transactions.filter(type='RECEIVED').aggregate(Sum('amount'))['amount__sum'] or 0
-    total_borrowed = transactions.filter(type='BORROWED').aggregate(Sum('amount'))['amount__sum'] or 0
-    total_paid_back = transactions.filter(type='PAID_BACK').aggregate(Sum('amount'))['amount__sum'] or 0
+def personal_dashboard_queries(user):
+    """The personal dashboard's independent queries as callables"""
+    # Person keeps running totals of its transactions, so balances are plain
+    # column arithmetic; sub-cent float noise from SQLite does not count
+    people = Person.objects.filter(user=user).annotate(balance=person_balance())
+    has_balance = Q(magnitude__gte=Decimal('0.005'))
+    return {
+        'totals': lambda: people.alias(magnitude=Abs('balance')).aggregate(
+            lent=Sum('lent', default=0),
+            received=Sum('received', default=0),
+            borrowed=Sum('borrowed', default=0),
+            paid_back=Sum('paid_back', default=0),
+            people_count=Count('id'),
+            active_balances=Count('id', filter=has_balance),
+        ),
+        'people': lambda: list(
+            people.alias(magnitude=Abs('balance')).filter(has_balance)
+            .order_by('-magnitude', 'name')
+            .values('id', 'name', 'relationship', 'balance')[:10]
+        ),
+    }
+
+def build_personal_dashboard(results):
+    totals = results['totals']
+    total_lent = totals['lent']
+    total_received = totals['received']
+    total_borrowed = totals['borrowed']
+    total_paid_back = totals['paid_back']
     
     # Net calculations
     net_lent = float(total_lent) - float(total_received)
     net_borrowed = float(total_borrowed) - float(total_paid_back)
     net_balance = net_lent - net_borrowed
     
-    # Get people with balances
-    people = Person.objects.filter(user=admin_user)
-    people_balances = []
-    for person in people:
-        balance = person.get_balance()
-        if balance != 0:
-            people_balances.append({
-                'id': person.id,
-                'name': person.name,
-                'relationship': person.relationship,
-                'balance': float(balance),
-                'status': 'owes_you' if balance > 0 else 'you_owe'
-            })
-    
-    # Sort by absolute balance
-    people_balances.sort(key=lambda x: abs(x['balance']), reverse=True)
+    # Top 10 people by absolute balance, already ordered by the query
+    people_balances = [
+        {
+            'id': person['id'],
+            'name': person['name'],
+            'relationship': person['relationship'],
+            'balance': float(person['balance']),
+            'status': 'owes_you' if person['balance'] > 0 else 'you_owe'
+        }
+        for person in results['people']
+    ]
     
-    return Response({
+    return {
         'total_lent': float(total_lent),
         'total_received': float(total_received),
         'total_borrowed': float(total_borrowed),
@@ -667,31 +1024,53 @@ def personal_dashboard(request):
         'net_lent': net_lent,
         'net_borrowed': net_borrowed,
         'net_balance': net_balance,
-        'people_count': people.count(),
-        'active_balances': len(people_balances),
-        'people_balances': people_balances[:10]  # Top 10
-    })
+        'people_count': totals['people_count'],
+        'active_balances': totals['active_balances'],
+        'people_balances': people_balances
+    }
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@csrf_exempt
+@caching.cached_response('personal_dashboard')
+def personal_dashboard(request):
+    """Get personal money management dashboard"""
+    admin_user = request.budget_user
+    if not admin_user:
+        return Response({'error': 'User not found'}, status=404)
+    
+    results = {name: query() for name, query in personal_dashboard_queries(admin_user).items()}
+    return Response(build_personal_dashboard(results))
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 @csrf_exempt
 def person_details(request, person_id):
     """Get detailed transactions for a specific person"""
-    admin_user = User.objects.filter(username='muskan').first()
+    admin_user = request.budget_user
     if not admin_user:
         return Response({'error': 'User not found'}, status=404)
     
     try:
         person = Person.objects.get(id=person_id, user=admin_user)
-        transactions = PersonalTransaction.objects.filter(user=admin_user, person=person).order_by('-date')
+        transactions = PersonalTransaction.objects.filter(user=admin_user, person=person)
         
-        serializer = PersonalTransactionSerializer(transactions, many=True)
+        # Transactions are paginated with ?page_size= / ?cursor=
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(transactions, request)
+        serializer = PersonalTransactionSerializer(
+            page if page is not None else transactions.order_by('-date'), many=True
+        )
         
-        return Response({
+        data = {
             'person': PersonSerializer(person).data,
             'transactions': serializer.data,
             'balance': float(person.get_balance())
-        })
+        }
+        if page is not None:
+            data['next'] = paginator.get_next_link()
+            data['previous'] = paginator.get_previous_link()
+        return Response(data)
     except Person.DoesNotExist:
         return Response({'error': 'Person not found'}, status=404)
 
@@ -700,13 +1079,14 @@ def person_details(request, person_id):
 @csrf_exempt
 def settle_person(request, person_id):
     """Mark all transactions with a person as settled"""
-    admin_user = User.objects.filter(username='muskan').first()
+    admin_user = request.budget_user
     if not admin_user:
         return Response({'error': 'User not found'}, status=404)
     
     try:
         person = Person.objects.get(id=person_id, user=admin_user)
         PersonalTransaction.objects.filter(user=admin_user, person=person).update(is_settled=True)
+        caching.bump_version(admin_user)
         
         return Response({'success': True, 'message': f'All transactions with {person.name} marked as settled'})
     except Person.DoesNotExist:
@@ -715,39 +1095,132 @@ def settle_person(request, person_id):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 @csrf_exempt
+@caching.cached_response('personal_reports')
+@read_replica
 def personal_reports(request):
     """Get personal money management reports"""
-    admin_user = User.objects.filter(username='muskan').first()
+    admin_user = request.budget_user
     if not admin_user:
         return Response({'error': 'User not found'}, status=404)
     
-    # Get last 6 months data
-    reports = []
-    for i in range(6):
-        target_date = datetime.now().replace(day=1) - timedelta(days=i*30)
-        month_start = target_date.replace(day=1).date()
-        
-        month_transactions = PersonalTransaction.objects.filter(
-            user=admin_user,
-            date__year=month_start.year,
-            date__month=month_start.month
+    # Last 6 calendar months, every type summed per month in one query
+    months = report_months(6)
+    rows = (
+        PersonalTransaction.objects.filter(user=admin_user, date__gte=months[-1], date__lt=next_month(months[0]))
+        .annotate(bucket=TruncMonth('date'))
+        .values('bucket')
+        .annotate(
+            lent=Sum('amount', filter=Q(type='LENT'), default=0),
+            received=Sum('amount', filter=Q(type='RECEIVED'), default=0),
+            borrowed=Sum('amount', filter=Q(type='BORROWED'), default=0),
+            paid_back=Sum('amount', filter=Q(type='PAID_BACK'), default=0),
+            count=Count('id'),
         )
-        
-        lent = month_transactions.filter(type='LENT').aggregate(Sum('amount'))['amount__sum'] or 0
-        received = month_transactions.filter(type='RECEIVED').aggregate(Sum('amount'))['amount__sum'] or 0
-        borrowed = month_transactions.filter(type='BORROWED').aggregate(Sum('amount'))['amount__sum'] or 0
-        paid_back = month_transactions.filter(type='PAID_BACK').aggregate(Sum('amount'))['amount__sum'] or 0
+        .order_by()
+    )
+    by_month = {row['bucket']: row for row in rows}
+    
+    reports = []
+    for month_start in months:
+        row = by_month.get(month_start, {})
+        lent = row.get('lent', 0)
+        received = row.get('received', 0)
+        borrowed = row.get('borrowed', 0)
+        paid_back = row.get('paid_back', 0)
         
         reports.append({
             'month': month_start.strftime('%Y-%m'),
-            'month_name': target_date.strftime('%B %Y'),
+            'month_name': month_start.strftime('%B %Y'),
             'lent': float(lent),
             'received': float(received),
             'borrowed': float(borrowed),
             'paid_back': float(paid_back),
             'net_lent': float(lent) - float(received),
             'net_borrowed': float(borrowed) - float(paid_back),
-            'transactions_count': month_transactions.count()
+            'transactions_count': row.get('count', 0)
         })
     
     return Response(reports)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@csrf_exempt
+@caching.cached_response('timeseries')
+def time_series(request):
+    """Totals per day, week or month over any date range, for charts"""
+    admin_user = request.budget_user
+    if not admin_user:
+        return Response({'error': 'User not found'}, status=404)
+    
+    params = request.query_params
+    granularity = params.get('granularity', 'day')
+    if granularity not in timeseries.GRANULARITIES:
+        return Response({'error': f"granularity must be one of {', '.join(timeseries.GRANULARITIES)}"}, status=400)
+    try:
+        end = datetime.strptime(params['end'], '%Y-%m-%d').date() if params.get('end') else datetime.now().date()
+        start = datetime.strptime(params['start'], '%Y-%m-%d').date() if params.get('start') else timeseries.default_start(end, granularity)
+    except ValueError:
+        return Response({'error': 'start and end must be dates in YYYY-MM-DD format'}, status=400)
+    if start > end:
+        return Response({'error': 'start must not be after end'}, status=400)
+    if len(timeseries.bucket_starts(start, end, granularity)) > timeseries.MAX_BUCKETS:
+        return Response({'error': 'Too many buckets; use a shorter range or a coarser granularity'}, status=400)
+    
+    trans_type = params.get('type') or None
+    if trans_type and trans_type not in timeseries.TRANSACTION_TYPES + timeseries.PERSONAL_TYPES:
+        return Response({'error': f"Unknown type '{trans_type}'"}, status=400)
+    payment_mode = params.get('payment_mode') or None
+    if payment_mode and payment_mode not in dict(Expense.PAYMENT_MODES):
+        return Response({'error': f"Unknown payment_mode '{payment_mode}'"}, status=400)
+    category = None
+    if params.get('category'):
+        value = params['category']
+        category = Category.objects.filter(**{'id' if value.isdigit() else 'name__iexact': value}).first()
+        if category is None:
+            return Response({'error': f"Unknown category '{value}'"}, status=400)
+    if trans_type and (category or payment_mode):
+        return Response({'error': 'category and payment_mode only apply to expenses, not to type'}, status=400)
+    
+    points = timeseries.series(admin_user, start, end, granularity, category, payment_mode, trans_type)
+    return Response({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'granularity': granularity,
+        'type': trans_type or 'EXPENSES',
+        'category': category.name if category else None,
+        'payment_mode': payment_mode,
+        'total': sum(point['total'] for point in points),
+        'count': sum(point['count'] for point in points),
+        'series': points,
+    })
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@csrf_exempt
+def search(request):
+    """Full-text search over expense, transaction and personal descriptions"""
+    admin_user = request.budget_user
+    if not admin_user:
+        return Response({'error': 'User not found'}, status=404)
+    
+    query = request.query_params.get('q', '').strip()
+    if not fulltext.search_terms(query):
+        return Response({'error': 'Pass a search string as ?q='}, status=400)
+    try:
+        page = int(request.query_params.get('page', 1))
+        page_size = int(request.query_params.get('page_size', SEARCH_PAGE_SIZE))
+    except ValueError:
+        return Response({'error': 'page and page_size must be integers'}, status=400)
+    if page < 1 or page_size < 1:
+        return Response({'error': 'page and page_size must be positive'}, status=400)
+    page_size = min(page_size, MAX_SEARCH_PAGE_SIZE)
+    
+    results, has_more = fulltext.search(admin_user, query, offset=(page - 1) * page_size, limit=page_size)
+    url = request.build_absolute_uri()
+    return Response({
+        'query': query,
+        'page': page,
+        'next': replace_query_param(url, 'page', page + 1) if has_more else None,
+        'previous': replace_query_param(url, 'page', page - 1) if page > 1 else None,
+        'results': results
+    })
@@ -0,0 +1,130 @@
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.utils import timezone
+from .models import Wallet, Transaction
+from . import caching
+
+ZERO = Decimal('0')
+CENTS = Decimal('0.01')
+
+
+def adjust_balance(user, delta, create=True):
+    """Apply `delta` to the user's wallet as one `UPDATE ... SET balance = balance + delta`.
+
+    The database does the arithmetic, so concurrent writers never overwrite
+    each other. The stored balance is the ledger's net, credits minus debits,
+    and goes below zero when expenses outrun the money added; get_balance()
+    shows it floored at zero. The wallet row is created on first use unless
+    `create` is False. `user` may be a User or its id.
+    """
+    delta = Decimal(delta)
+    changes = {'balance': F('balance') + delta, 'updated_at': timezone.now()}
+    if Wallet.objects.filter(user=user).update(**changes) or not create:
+        return
+    try:
+        with transaction.atomic():
+            Wallet.objects.create(user_id=getattr(user, 'pk', user), balance=delta)
+    except IntegrityError:
+        # Another request created the wallet first
+        Wallet.objects.filter(user=user).update(**changes)
+
+
+def credit(user, amount, create=True):
+    adjust_balance(user, amount, create=create)
+
+
+def debit(user, amount, create=True):
+    adjust_balance(user, -Decimal(amount), create=create)
+
+
+def reverse_transaction(trans):
+    """Undo a ledger entry's effect on the wallet.
+
+    Never creates a wallet: during a cascading user delete the wallet may
+    already be gone, and there is nothing left to correct.
+    """
+    if trans.type == 'EXPENSE':
+        # An expense debited the wallet, so give the money back
+        credit(trans.user_id, trans.amount, create=False)
+        ledger_change = trans.amount
+    else:
+        # ADD and REFUND credited the wallet
+        debit(trans.user_id, trans.amount, create=False)
+        ledger_change = -trans.amount
+    # Take the entry back out of the checkpoint if it was already folded in
+    Wallet.objects.filter(user_id=trans.user_id, reconciled_transaction_id__gte=trans.pk).update(
+        reconciled_balance=F('reconciled_balance') + ledger_change
+    )
+
+
+def get_balance(user):
+    """The balance to show: the ledger net, floored at zero as the dashboard always has been"""
+    return max(ZERO, Wallet.objects.filter(user=user).values_list('balance', flat=True).first() or ZERO)
+
+
+def ledger_totals(user, after_id=0):
+    """Credits, debits, count and last id of the user's transactions newer than `after_id`"""
+    return Transaction.objects.filter(user=user, id__gt=after_id).aggregate(
+        credits=Sum('amount', filter=Q(type__in=['ADD', 'REFUND']), default=ZERO),
+        debits=Sum('amount', filter=Q(type='EXPENSE'), default=ZERO),
+        count=Count('id'),
+        last_id=Max('id'),
+    )
+
+
+def reconcile(user, repair=False, full=False):
+    """Check a wallet against its ledger, reading only transactions since the last checkpoint.
+
+    The wallet's checkpoint holds the ledger balance up to a transaction id;
+    newer transactions are folded into it and the checkpoint moves forward.
+    `full` starts again from the first transaction. With `repair` a wallet
+    that drifted from the ledger balance is corrected. Both are the plain net
+    of credits and debits (see adjust_balance), so a user who overspent and
+    topped up again reconciles cleanly.
+
+    The wallet row is locked while reading the ledger. Every writer moves
+    the wallet before inserting its ledger rows in the same transaction, so
+    no uncommitted transaction can hold an id below the new checkpoint.
+    Returns a dict describing the wallet, or None if the user has none.
+    """
+    with transaction.atomic():
+        wallet = Wallet.objects.select_for_update().filter(user=user).first()
+        if wallet is None:
+            return None
+        after_id = 0 if full else wallet.reconciled_transaction_id
+        ledger = ledger_totals(wallet.user_id, after_id)
+        ledger_balance = (ZERO if full else wallet.reconciled_balance) + ledger['credits'] - ledger['debits']
+        # SQLite sums decimals as floats
+        expected = Decimal(ledger_balance).quantize(CENTS)
+        drift = wallet.balance - expected
+
+        changes = {
+            'reconciled_transaction_id': ledger['last_id'] or after_id,
+            'reconciled_balance': expected,
+            'reconciled_at': timezone.now(),
+        }
+        repaired = bool(repair and drift)
+        if repaired:
+            changes['balance'] = expected
+            # The balance changes without a ledger write, so cached responses would not notice
+            caching.bump_version(wallet.user_id)
+        Wallet.objects.filter(pk=wallet.pk).update(**changes)
+
+    return {
+        'user_id': wallet.user_id,
+        'balance': wallet.balance,
+        'expected': expected,
+        'drift': drift,
+        'repaired': repaired,
+        'folded': ledger['count'],
+        'checkpoint': changes['reconciled_transaction_id'],
+    }
+
+
+def reconcile_all(repair=False, full=False):
+    """reconcile() every wallet; yields the per-wallet results"""
+    for user_id in list(Wallet.objects.order_by('user_id').values_list('user_id', flat=True)):
+        result = reconcile(user_id, repair=repair, full=full)
+        if result is not None:
+            yield result
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'budget.middleware.SQLInstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'budget.middleware.DisableCSRFMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -50,6 +52,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'budget.middleware.BudgetUserMiddleware',
+    'budget.middleware.BudgetETagMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,12 +86,77 @@ WSGI_APPLICATION = 'budget_tracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# BUDGET_DB_PROFILE selects one of these: 'sqlite' (default) or 'mysql'
+# (see setup_mysql.md). Connections stay open for CONN_MAX_AGE seconds, so
+# each worker thread reuses one instead of reconnecting on every request,
+# and are pinged before reuse.
+DATABASE_PROFILES = {
+    'sqlite': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'NAME': os.environ.get('BUDGET_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('BUDGET_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+    },
+    'mysql': {
+        'ENGINE': 'django.db.backends.mysql',
+        'NAME': os.environ.get('MYSQL_DATABASE', 'budget_tracker'),
+        'USER': os.environ.get('MYSQL_USER', 'root'),
+        'PASSWORD': os.environ.get('MYSQL_PASSWORD', ''),
+        'HOST': os.environ.get('MYSQL_HOST', 'localhost'),
+        'PORT': os.environ.get('MYSQL_PORT', '3306'),
+        'CONN_MAX_AGE': int(os.environ.get('BUDGET_CONN_MAX_AGE', 300)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'charset': 'utf8mb4',
+            'connect_timeout': 5,
+            'isolation_level': 'read committed',
+            # Fail a blocked wallet update after 10s instead of the 50s default
+            'init_command': "SET sql_mode='STRICT_TRANS_TABLES', innodb_lock_wait_timeout=10",
+        },
+    },
 }
+BUDGET_DB_PROFILE = os.environ.get('BUDGET_DB_PROFILE', 'sqlite')
+if BUDGET_DB_PROFILE not in DATABASE_PROFILES:
+    raise ValueError(f"BUDGET_DB_PROFILE must be one of {', '.join(DATABASE_PROFILES)}, not {BUDGET_DB_PROFILE!r}")
+
+DATABASES = {
+    'default': DATABASE_PROFILES[BUDGET_DB_PROFILE],
+}
+
+# Optional read replica for the analytics and report views (budget.db.read_replica).
+# Locally, point BUDGET_SQLITE_REPLICA_PATH at a second SQLite file and keep it
+# in sync with `manage.py sync_replica --interval 10`; with MySQL, set
+# MYSQL_REPLICA_HOST to a replica of the primary.
+BUDGET_REPLICA_ALIAS = 'replica'
+if BUDGET_DB_PROFILE == 'sqlite' and os.environ.get('BUDGET_SQLITE_REPLICA_PATH'):
+    DATABASES[BUDGET_REPLICA_ALIAS] = dict(DATABASES['default'], NAME=os.environ['BUDGET_SQLITE_REPLICA_PATH'])
+elif BUDGET_DB_PROFILE == 'mysql' and os.environ.get('MYSQL_REPLICA_HOST'):
+    DATABASES[BUDGET_REPLICA_ALIAS] = dict(
+        DATABASES['default'],
+        HOST=os.environ['MYSQL_REPLICA_HOST'],
+        PORT=os.environ.get('MYSQL_REPLICA_PORT', DATABASES['default']['PORT']),
+    )
+DATABASE_ROUTERS = ['budget.db.ReplicaRouter']
+# After a write, the user's reads stay on the primary this long, so they see
+# their own changes; keep it above the replica's lag (the sync interval locally)
+BUDGET_REPLICA_STICKY_SECONDS = int(os.environ.get('BUDGET_REPLICA_STICKY_SECONDS', 30))
+
+# Applied to every new SQLite connection (budget.db). WAL lets readers run
+# alongside the writer; synchronous=NORMAL is durable with WAL except for the
+# last commits on power loss; busy_timeout (ms) makes a writer wait for the
+# lock instead of failing with "database is locked".
+BUDGET_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 10000,
+    'cache_size': -65536,  # KiB, i.e. 64 MiB
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+# Start transactions with BEGIN IMMEDIATE so they take the write lock up
+# front; a deferred transaction that reads first and then writes cannot wait
+# for the lock and fails with "database is locked" at once.
+BUDGET_SQLITE_IMMEDIATE_TRANSACTIONS = True
 
 
 # Password validation
@@ -155,9 +224,67 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-    ]
+    ],
+    # Default page size for the keyset-paginated list endpoints. None keeps
+    # them unpaginated unless the client asks with ?page_size= or ?cursor=
+    'PAGE_SIZE': None,
 }
 
 SESSION_COOKIE_AGE = 86400
 SESSION_SAVE_EVERY_REQUEST = True
-SESSION_EXPIRE_AT_BROWSER_CLOSE = False
\ No newline at end of file
+SESSION_EXPIRE_AT_BROWSER_CLOSE = False
+
+# Acting-user resolution (budget.middleware.BudgetUserMiddleware). Requests
+# without a logged-in session act as BUDGET_DEFAULT_USERNAME; set it to None
+# to turn the demo fallback off.
+BUDGET_DEFAULT_USERNAME = 'muskan'
+BUDGET_USER_CACHE_SIZE = 1024
+BUDGET_USER_CACHE_TTL = 300
+
+# Cache for the analytics responses (budget.caching). Locmem is per process;
+# with several worker processes point BUDGET_CACHE_ALIAS at a shared backend,
+# e.g. 'django.core.cache.backends.filebased.FileBasedCache' or redis/memcached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'budget-tracker',
+    }
+}
+BUDGET_CACHE_ALIAS = 'default'
+BUDGET_CACHE_TIMEOUT = 3600
+
+# URL names served by the concurrent async views in budget.async_views
+# ('dashboard', 'monthly_reports', 'personal_dashboard'); meant for ASGI.
+BUDGET_ASYNC_ROUTES = []
+
+# Fold each new transaction into the wallet's reconciliation checkpoint right
+# after it commits, instead of only when `manage.py reconcile_wallets` runs.
+BUDGET_RECONCILE_AFTER_WRITES = False
+
+# Per-request SQL profiling (budget.middleware.SQLInstrumentationMiddleware):
+# Server-Timing headers, plus slow requests and N+1 query loops written to
+# slow_requests.log. Off unless turned on here.
+BUDGET_SQL_INSTRUMENTATION = False
+BUDGET_SLOW_REQUEST_MS = 500
+BUDGET_REPEATED_QUERY_THRESHOLD = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': BASE_DIR / 'slow_requests.log',
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'budget.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}